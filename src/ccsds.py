@@ -9,15 +9,18 @@ from Crypto.Cipher import DES
 from enum import Enum
 import os
 
+import sink
+
 
 class VCDU:
     """
     Parses CCSDS Virtual Channel Data Unit (VCDU)
     """
 
-    def __init__(self, data):
+    def __init__(self, data, arrived=None):
         self.data = data
         self.tools = Tools()
+        self.arrived = arrived      # Arrival time (perf_counter)
         self.parse()
     
     def parse(self):
@@ -128,6 +131,7 @@ class CP_PDU:
         self.tools = Tools()
         self.PARSED = False
         self.PAYLOAD = None
+        self.arrived = None         # Arrival time of last VCDU (perf_counter)
         self.Sequence = Enum('Sequence', 'CONTINUE FIRST LAST SINGLE')
 
         # Parse header once enough data is present
@@ -287,6 +291,7 @@ class TP_File:
         self.data = data
         self.tools = Tools()
         self.PAYLOAD = None
+        self.arrived = None         # Arrival time of last VCDU (perf_counter)
         self.parse()
     
     def parse(self):
@@ -370,6 +375,7 @@ class S_PDU:
         self.headerField = None
         self.dataField = None
         self.PLAINTEXT = None
+        self.failed = False         # Unknown encryption key index
 
         # Check keys have been loaded
         if self.keys != {}:
@@ -419,7 +425,9 @@ class S_PDU:
         try:
             self.key = self.keys[self.index]
         except KeyError:
-            if self.index != b'\x00\x00': print("  UNKNOWN ENCRYPTION KEY INDEX")
+            if self.index != b'\x00\x00':
+                print("  UNKNOWN ENCRYPTION KEY INDEX")
+                self.failed = True
             self.key = 0
         
         # Check block length if encryption is applied
@@ -468,6 +476,7 @@ class xRIT:
     def __init__(self, data):
         self.data = data
         self.tools = Tools()
+        self.arrived = None         # Arrival time of last VCDU (perf_counter)
         self.parse()
     
     def parse(self):
@@ -565,7 +574,7 @@ class xRIT:
 
         # Save file to disk
         outPath = self.get_save_path(root)
-        outFile = open(outPath, mode="wb")
+        outFile = sink.open_file(outPath)
         outFile.write(self.data)
         outFile.close()
 
@@ -5,27 +5,54 @@ https://github.com/sam210723/xrit-rx
 Dashboard HTTP server
 """
 
+from collections import namedtuple, OrderedDict
 from colorama import Fore, Back, Style
+from email.utils import formatdate, parsedate_to_datetime
+import gzip
+import hashlib
+import hmac
 import http.server
+import io
 import json
 import mimetypes
 import os
+import pathlib
+from PIL import Image, UnidentifiedImageError
+import socket
 import socketserver
-from threading import Thread
+from threading import BoundedSemaphore, Event, Lock, Thread
+from time import sleep, time
+from urllib.parse import parse_qs, urlsplit
+
+import sampler
+import tracer
 
 dash_config = None
 demuxer_instance = None
+assets = {}             # Static dashboard files loaded at startup
+thumbnails = None       # Resized image cache
+state = None            # Cached state document shared by all clients
+state_lock = Lock()     # Lock for cached state document
+asset = namedtuple('asset', 'data gzip etag modified mime')
 
 class Dashboard:
     def __init__(self, config, demuxer):
         global dash_config
         global demuxer_instance
+        global thumbnails
 
         dash_config = config
         demuxer_instance = demuxer
+        thumbnails = Thumbnails(dash_config.cache * 1024 * 1024, dash_config.cache_path, dash_config.cache_disk * 1024 * 1024)
+
+        # Per-request socket timeout
+        Handler.timeout = dash_config.timeout
+
+        # Load and compress static files once
+        self.load_assets("html")
 
         try:
-            self.socket = socketserver.TCPServer(("", int(dash_config.port)), Handler)
+            self.socket = Server(("", int(dash_config.port)), Handler, dash_config.connections)
         except OSError as e:
             if e.errno == 10048:
                 print("\n" + Fore.WHITE + Back.RED + Style.BRIGHT + "DASHBOARD NOT STARTED: PORT ALREADY IN USE")
@@ -40,6 +67,31 @@ class Dashboard:
         self.httpd_thread.start()
 
 
+    def load_assets(self, root):
+        """
+        Loads static dashboard files into memory with pre-compressed copies and validators
+        """
+
+        for f in pathlib.Path(root).glob("**/*"):
+            if not f.is_file(): continue
+
+            data = f.read_bytes()
+            mime = mimetypes.guess_type(str(f))[0] or "application/octet-stream"
+            stat = f.stat()
+
+            # Only keep compressed copy if it is smaller
+            gz = gzip.compress(data, 9) if compressible(mime) else None
+            if gz != None and len(gz) >= len(data): gz = None
+
+            assets[f.relative_to(root).as_posix()] = asset(
+                data,
+                gz,
+                get_etag(stat),
+                stat.st_mtime,
+                mime
+            )
+
+
     def http_server(self):
         """
         HTTP server and request handler thread
@@ -55,57 +107,667 @@ class Dashboard:
 
         try:
             self.socket.shutdown()
+            self.socket.server_close()
         except AttributeError:
             return
 
 
+class Thumbnails:
+    """
+    Resized product images in a size-bounded LRU cache with optional disk spill
+    """
+
+    formats = {
+        "jpeg": ("JPEG", "image/jpeg", { 'quality': 85 }),
+        "png":  ("PNG",  "image/png",  {}),
+        "webp": ("WEBP", "image/webp", { 'quality': 85 })
+    }
+
+    def __init__(self, budget, path, disk):
+        """
+        Initialises thumbnail cache
+
+        Arguments:
+            budget {int} -- Maximum bytes of thumbnails kept in memory
+            path {string} -- Directory for thumbnails evicted from memory (empty to disable)
+            disk {int} -- Maximum bytes of thumbnails kept in disk directory
+        """
+
+        self.budget = budget            # Memory budget (bytes)
+        self.path = path                # Disk spill directory
+        self.disk = disk                # Disk budget (bytes)
+        self.cache = OrderedDict()      # Cached thumbnails (least recently used first)
+        self.size = 0                   # Bytes held in memory
+        self.spilled = OrderedDict()    # Sizes of thumbnails on disk by path (least recently used first)
+        self.spill_size = 0             # Bytes held on disk
+        self.resizing = {}              # Events set when in-progress resizes finish, by key
+        self.lock = Lock()              # Lock for cache dicts
+
+        if self.path:
+            pathlib.Path(self.path).mkdir(parents=True, exist_ok=True)
+
+            # Track thumbnails left by previous runs
+            files = [f for f in pathlib.Path(self.path).iterdir() if f.is_file() and f.suffix[1:] in self.formats]
+            for f in sorted(files, key=lambda f: f.stat().st_mtime):
+                self.add_spill(str(f), f.stat().st_size)
+            self.trim_spill()
+
+    def get(self, path, width, fmt):
+        """
+        Gets resized image from cache, creating it if required
+
+        Arguments:
+            path {string} -- Source image path
+            width {int} -- Output width in pixels
+            fmt {string} -- Output format (jpeg, png or webp)
+
+        Returns:
+            tuple -- Image bytes, MIME type and entity tag (None if source is not an image)
+        """
+
+        stat = os.stat(path)
+        key = "{}|{}|{}|{}|{}".format(path, stat.st_mtime, stat.st_size, width, fmt)
+        etag = '"{}"'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+        mime = self.formats[fmt][1]
+        spill = os.path.join(self.path, etag.strip('"') + "." + fmt) if self.path else None
+
+        # Memory cache, waiting for another request already resizing the same image
+        while True:
+            with self.lock:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    return self.cache[key][0], mime, etag
+
+                done = self.resizing.get(key)
+                if done == None:
+                    done = self.resizing[key] = Event()
+                    break
+            done.wait()
+
+        try:
+            # Disk cache
+            with self.lock:
+                cached = spill in self.spilled
+                if cached: self.spilled.move_to_end(spill)
+
+            if cached and os.path.isfile(spill):
+                with open(spill, 'rb') as f: data = f.read()
+            else:
+                data = self.resize(path, width, fmt)
+                if data == None: return None
+            
+            self.put(key, data, spill)
+            return data, mime, etag
+        finally:
+            with self.lock: del self.resizing[key]
+            done.set()
+
+    def put(self, key, data, spill):
+        """
+        Adds thumbnail to memory cache, evicting least recently used thumbnails to disk
+        """
+
+        evicted = []
+        with self.lock:
+            if key in self.cache: return
+
+            self.cache[key] = (data, spill)
+            self.size += len(data)
+
+            while self.size > self.budget and self.cache:
+                d, s = self.cache.popitem(last=False)[1]
+                self.size -= len(d)
+                if s and s not in self.spilled: evicted.append((d, s))
+        
+        for d, s in evicted:
+            try:
+                with open(s, 'wb') as f: f.write(d)
+            except OSError:
+                continue
+
+            with self.lock: self.add_spill(s, len(d))
+        
+        if evicted: self.trim_spill()
+
+    def add_spill(self, path, size):
+        """
+        Tracks thumbnail written to disk directory (call with lock held)
+        """
+
+        self.spilled[path] = size
+        self.spill_size += size
+
+    def trim_spill(self):
+        """
+        Deletes least recently used thumbnails from disk directory until it is within budget
+        """
+
+        removed = []
+        with self.lock:
+            while self.spill_size > self.disk and self.spilled:
+                path, size = self.spilled.popitem(last=False)
+                self.spill_size -= size
+                removed.append(path)
+        
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def resize(self, path, width, fmt):
+        """
+        Resizes image to width, preserving aspect ratio
+        """
+
+        try:
+            img = Image.open(path)
+        except (UnidentifiedImageError, OSError):
+            return None
+
+        with img:
+            height = max(1, round(img.size[1] * width / img.size[0]))
+
+            # Let JPEG decoder downscale by up to 8x while decoding
+            img.draft(img.mode, (width, height))
+            img = img.resize((width, height), Image.BILINEAR, reducing_gap=2.0)
+        
+        if fmt == "jpeg" and img.mode not in ["L", "RGB"]: img = img.convert("RGB")
+
+        buf = io.BytesIO()
+        name, _, params = self.formats[fmt]
+        img.save(buf, format=name, **params)
+        return buf.getvalue()
+
+
+def get_state():
+    """
+    Returns combined state document, rebuilt at most once per event or dashboard interval
+    """
+
+    global state
+
+    with state_lock:
+        gen = demuxer_instance.events.count
+        if state != None and state[0] == gen and time() - state[1] < dash_config.interval:
+            return state[2:]
+        
+        previews = demuxer_instance.products.previews
+        content = {
+            'vcid': demuxer_instance.currentVCID,
+            'image': demuxer_instance.lastImage,
+            'xrit': demuxer_instance.lastXRIT,
+            'queue': {
+                'rx': len(demuxer_instance.rxq)
+            },
+            'products': demuxer_instance.products.state()['products'],
+            'previews': previews.state() if previews != None else {},
+            'schedule': demuxer_instance.schedule.received
+        }
+
+        data = json.dumps(content, sort_keys=False).encode('utf-8')
+        etag = '"{:x}-{:x}"'.format(gen, int(time() * 1000))
+        gz = gzip.compress(data, 6) if len(data) > 512 else None
+        state = (gen, time(), data, gz, etag)
+        return state[2:]
+
+
+def compressible(mime):
+    """
+    Checks if content of a MIME type benefits from compression
+    """
+
+    return mime.startswith("text/") or mime in ["application/json", "application/javascript", "image/svg+xml"]
+
+
+def get_etag(stat):
+    """
+    Builds entity tag from file modification time and size
+    """
+
+    return '"{:x}-{:x}"'.format(int(stat.st_mtime * 1000), stat.st_size)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Threaded HTTP server with a concurrent connection limit
+    """
+
+    daemon_threads = True               # Do not wait for request threads on exit
+    allow_reuse_address = True          # Allow quick restarts on the same port
+
+    def __init__(self, address, handler, limit):
+        self.slots = BoundedSemaphore(limit)    # Available connection slots
+        self.idle = set()                       # Keep-alive connections waiting without a slot
+        super().__init__(address, handler)
+
+
+    def process_request(self, request, client_address):
+        """
+        Start request thread if a connection slot is available
+        """
+
+        # Reject connections over the limit without starting a thread
+        if not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+
+        super().process_request(request, client_address)
+
+
+    def process_request_thread(self, request, client_address):
+        """
+        Handle requests then release connection slot if it is still held
+        """
+
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            if request in self.idle:
+                self.idle.discard(request)
+            else:
+                self.slots.release()
+
+
+    def handle_error(self, request, client_address):
+        """
+        Silence dropped and timed out connections
+        """
+
+        return
+
+
 class Handler(http.server.SimpleHTTPRequestHandler):
     """
     Custom HTTP request handler
     """
 
+    # Persistent (keep-alive) connections
+    protocol_version = "HTTP/1.1"
+
     def __init__(self, request, client_address, server):
         try:
             super().__init__(request, client_address, server)
-        except ConnectionResetError:
+        except (ConnectionError, socket.timeout):
             return
 
 
+    def handle(self):
+        """
+        Handle requests on a connection, giving up its slot while idle between keep-alive requests
+        """
+
+        self.close_connection = True
+        self.handle_one_request()
+
+        while not self.close_connection:
+            # Wait for next request without holding a slot
+            self.server.idle.add(self.request)
+            self.server.slots.release()
+
+            try:
+                waiting = self.rfile.peek(1)
+            except (OSError, ValueError):
+                waiting = b''
+            if not waiting: return
+
+            # Wait briefly for a free slot, rejecting the request if none become available
+            if not self.server.slots.acquire(timeout=self.timeout):
+                try:
+                    self.wfile.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                except OSError:
+                    pass
+                return
+            self.server.idle.discard(self.request)
+
+            self.handle_one_request()
+
+
     def do_GET(self):
         """
         Respond to GET requests
         """
 
+        # Split query string from path
+        url = urlsplit(self.path)
+        self.path = url.path
+        self.query = parse_qs(url.query)
+
         # Respond with index.html content on root path requests
         if self.path == "/": self.path = "index.html"
         
         try:
-            if self.path.startswith("/api/") or self.path == "/api":    # API endpoint requests
-                content, status, mime = self.handle_api(self.path)
-
-                self.send_response(status)
-                self.send_header('Content-type', mime)
-                self.end_headers()
-                self.wfile.write(content)
+            if self.path == "/api/events":                              # Event stream requests
+                self.handle_events()
+            elif self.path == "/api/state":                             # Combined state requests
+                data, gz, etag = get_state()
+                self.send_content(data, 200, "application/json", etag, None, "no-cache", gz)
+            elif self.path == "/api/admin/profile":                     # Sampling profiler requests
+                self.handle_profile()
+            elif self.path == "/api/trace":                             # Trace event requests
+                if tracer.enabled:
+                    self.send_content(tracer.export().encode('utf-8'), 200, "application/json", cache="no-store")
+                else:
+                    self.send_content(b'', 404)
+            elif self.path == "/metrics":                               # Prometheus metrics requests
+                content = demuxer_instance.metrics.render().encode('utf-8')
+                self.send_content(content, 200, "text/plain; version=0.0.4; charset=utf-8", cache="no-store")
+            elif self.path.startswith("/api/") or self.path == "/api":  # API endpoint requests
+                path = os.path.normpath(self.path[5:])
+                root = os.path.normpath(dash_config.output)
+
+                # Path is inside demuxer output root path
+                if path.startswith(root + os.sep) and os.path.isfile(path):
+                    self.send_file(path)
+                elif self.path.startswith("/api/thumbnail/"):
+                    self.send_thumbnail(os.path.normpath(self.path[15:]), root)
+                else:
+                    content, status, mime = self.handle_api(self.path)
+                    self.send_content(content, status, mime, cache="no-store")
             else:                                                       # Local file requests
-                self.path = "html/{}".format(self.path)
+                f = assets.get(self.path.lstrip("/"))
 
-                if os.path.isfile(self.path):                           # Requested file exists (HTTP 200)
-                    self.send_response(200)
-                    mime = mimetypes.guess_type(self.path)[0]
-                    self.send_header('Content-type', mime)
-                    self.end_headers()
-
-                    self.wfile.write(
-                        open(self.path, 'rb').read()
-                    )
+                if f != None:                                           # Requested file exists (HTTP 200)
+                    self.send_content(f.data, 200, f.mime, f.etag, f.modified, "no-cache", f.gzip)
                 else:                                                   # Requested file not found (HTTP 404)
-                    self.send_response(404)
-                    self.end_headers()
-        except ConnectionAbortedError:
+                    self.send_content(b'', 404)
+        except (ConnectionError, socket.timeout):
             return
     
 
+    def send_file(self, path):
+        """
+        Stream file from disk with support for conditional and range requests
+        """
+
+        stat = os.stat(path)
+        size = stat.st_size
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        etag = get_etag(stat)
+        cache = "max-age=3600"
+
+        # Respond with 304 if client already has current file
+        if self.not_modified(etag, stat.st_mtime):
+            self.send_response(304)
+            self.send_validators(etag, stat.st_mtime, cache)
+            self.end_headers()
+            return
+        
+        # Get requested byte range
+        rng = self.get_range(size, etag)
+        if rng == False:
+            self.send_response(416)
+            self.send_header('Content-Range', "bytes */{}".format(size))
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+            return
+        
+        if rng == None:
+            start, end = 0, size - 1
+            self.send_response(200)
+        else:
+            start, end = rng
+            self.send_response(206)
+            self.send_header('Content-Range', "bytes {}-{}/{}".format(start, end, size))
+        
+        self.send_header('Content-type', mime)
+        self.send_validators(etag, stat.st_mtime, cache)
+        self.send_header('Accept-Ranges', "bytes")
+        self.send_header('Content-Length', end - start + 1)
+        self.end_headers()
+
+        with open(path, 'rb') as f:
+            self.copy_file(f, start, end - start + 1)
+
+
+    def send_thumbnail(self, path, root):
+        """
+        Send resized copy of an output image
+        """
+
+        # Get requested width and format
+        try:
+            width = int(self.query.get('width', ["500"])[0])
+        except ValueError:
+            width = 500
+        width = min(max(width, 16), 4096)
+        fmt = self.query.get('format', ["jpeg"])[0].lower().replace("jpg", "jpeg")
+
+        thumb = None
+        if path.startswith(root + os.sep) and os.path.isfile(path) and fmt in Thumbnails.formats:
+            thumb = thumbnails.get(path, width, fmt)
+        
+        if thumb == None:
+            self.send_content(b'', 404)
+            return
+        
+        data, mime, etag = thumb
+        self.send_content(data, 200, mime, etag, None, "max-age=3600")
+
+
+    def get_range(self, size, etag):
+        """
+        Parses single byte range from Range header
+
+        Returns:
+            tuple -- First and last byte positions (None for whole file, False if unsatisfiable)
+        """
+
+        header = self.headers.get('Range')
+        if header == None or not header.startswith("bytes=") or "," in header: return None
+
+        # Ignore range if file has changed since the client's partial copy
+        ifr = self.headers.get('If-Range')
+        if ifr != None and ifr.strip() != etag: return None
+
+        try:
+            first, last = header[6:].strip().split("-")
+            if first == "":
+                # Suffix range (last n bytes)
+                start = max(0, size - int(last))
+                end = size - 1
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last != "" else size - 1
+        except ValueError:
+            return None
+        
+        if start > end or start >= size: return False
+        return (start, end)
+
+
+    def copy_file(self, f, offset, count):
+        """
+        Copies file to client socket using zero-copy sendfile, optionally limited to a maximum bandwidth
+        """
+
+        rate = dash_config.bandwidth * 1024
+
+        # Unlimited bandwidth
+        if not rate:
+            sent = self.connection.sendfile(f, offset, count)
+        else:
+            # Send chunks of 1/10th of a second each, pausing when ahead of the limit
+            chunk = max(1024, rate // 10)
+            sent = 0
+            start = time()
+
+            while sent < count:
+                n = self.connection.sendfile(f, offset + sent, min(chunk, count - sent))
+                if not n: break
+                sent += n
+
+                ahead = (sent / rate) - (time() - start)
+                if ahead > 0: sleep(ahead)
+        
+        # File was truncated or rewritten during transfer, body is shorter than Content-Length
+        if sent < count: self.close_connection = True
+
+
+    def send_content(self, content, status=200, mime=None, etag=None, modified=None, cache=None, gz=None):
+        """
+        Send response with length, caching and compression headers
+
+        Arguments:
+            content {bytes} -- Response body
+            status {int} -- HTTP status code
+            mime {string} -- Content MIME type
+            etag {string} -- Entity tag of content
+            modified {float} -- Content modification time (UNIX timestamp)
+            cache {string} -- Cache-Control header value
+            gz {bytes} -- Pre-compressed response body
+        """
+
+        # Respond with 304 if client already has current content
+        if status == 200 and self.not_modified(etag, modified):
+            self.send_response(304)
+            self.send_validators(etag, modified, cache)
+            self.end_headers()
+            return
+
+        # Compress body if client accepts gzip
+        accepts = "gzip" in self.headers.get('Accept-Encoding', "")
+        if accepts and gz == None and mime != None and compressible(mime) and len(content) > 512:
+            gz = gzip.compress(content, 6)
+        
+        self.send_response(status)
+        if mime != None: self.send_header('Content-type', mime)
+        self.send_validators(etag, modified, cache)
+
+        if accepts and gz != None:
+            content = gz
+            self.send_header('Content-Encoding', "gzip")
+        if gz != None: self.send_header('Vary', "Accept-Encoding")
+
+        self.send_header('Content-Length', len(content))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+    def send_validators(self, etag, modified, cache):
+        """
+        Send ETag, Last-Modified and Cache-Control headers
+        """
+
+        if etag != None: self.send_header('ETag', etag)
+        if modified != None: self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+        if cache != None: self.send_header('Cache-Control', cache)
+
+
+    def not_modified(self, etag, modified):
+        """
+        Checks If-None-Match and If-Modified-Since request headers against content validators
+        """
+
+        # If-None-Match takes precedence over If-Modified-Since
+        inm = self.headers.get('If-None-Match')
+        if inm != None:
+            return etag != None and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")])
+
+        ims = self.headers.get('If-Modified-Since')
+        if ims != None and modified != None:
+            try:
+                return int(modified) <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+
+    def handle_profile(self):
+        """
+        Captures statistical profile of all threads (admin only)
+
+        Query parameters:
+            seconds {float} -- Capture duration (1 to 60, default 10)
+            format {string} -- collapsed (default), top or svg
+        """
+
+        # Admin endpoints are disabled unless a token is configured
+        token = self.headers.get('Authorization', "").replace("Bearer ", "", 1)
+        token = token or self.query.get("token", [""])[0]
+        if not dash_config.admin or not hmac.compare_digest(token.encode('utf-8'), dash_config.admin.encode('utf-8')):
+            self.send_content(b'', 403)
+            return
+
+        try:
+            seconds = min(max(float(self.query.get("seconds", [10])[0]), 1), 60)
+            fmt = self.query.get("format", ["collapsed"])[0]
+            render, mime = {
+                "collapsed": (sampler.collapsed, "text/plain; charset=utf-8"),
+                "top": (sampler.top, "text/plain; charset=utf-8"),
+                "svg": (sampler.flamegraph, "image/svg+xml")
+            }[fmt]
+        except (ValueError, KeyError):
+            self.send_content(b'', 400)
+            return
+
+        # Only one capture at a time
+        if not sampler.lock.acquire(blocking=False):
+            self.send_content(b'', 409)
+            return
+
+        try:
+            stacks = sampler.capture(seconds)
+        finally:
+            sampler.lock.release()
+
+        self.send_content(render(stacks).encode('utf-8'), 200, mime, cache="no-store")
+
+
+    def handle_events(self):
+        """
+        Stream demuxer events to client as Server-Sent Events
+        """
+
+        # Stream ends when connection closes
+        self.close_connection = True
+
+        self.send_response(200)
+        self.send_header('Content-type', "text/event-stream")
+        self.send_header('Cache-Control', "no-cache")
+        self.send_header('Connection', "close")
+        self.end_headers()
+
+        # Streams stay open for as long as the dashboard does, so give up connection slot
+        self.server.idle.add(self.request)
+        self.server.slots.release()
+
+        # Send current state before waiting for new events
+        self.send_event("vcid", { 'vcid': demuxer_instance.currentVCID })
+        self.send_event("image", { 'image': demuxer_instance.lastImage })
+        self.send_event("xrit", { 'xrit': demuxer_instance.lastXRIT })
+
+        sub = demuxer_instance.events.subscribe()
+        try:
+            while True:
+                events = sub.get(15)
+
+                # Keep connection alive while no events are published
+                if not events:
+                    self.wfile.write(b": keepalive\n\n")
+                
+                for event, data in events:
+                    self.send_event(event, data)
+        finally:
+            demuxer_instance.events.unsubscribe(sub)
+
+
+    def send_event(self, event, data):
+        """
+        Write single Server-Sent Event to client
+        """
+
+        self.wfile.write("event: {}\ndata: {}\n\n".format(
+            event,
+            json.dumps(data, sort_keys=False)
+        ).encode('utf-8'))
+
+
     def handle_api(self, path):
         """
         Handle API endpoint request
@@ -129,21 +791,51 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 'output_path': dash_config.output,
                 'images': dash_config.images,
                 'xrit': dash_config.xrit,
-                'interval': int(dash_config.interval)
+                'interval': int(dash_config.interval),
+                'preview': dash_config.preview,
+                'tiles': dash_config.tiles
             }
         
-        elif "/".join(path).startswith(dash_config.output):     # Endpoint starts with demuxer output root path
-            path = "/".join(path)
-            if (os.path.isfile(path)):
-                mime = mimetypes.guess_type(path)[0]
-                content = open(path, 'rb').read()
-
         elif path[0] == "current" and len(path) == 2:
             if path[1] == "vcid":
                 content = {
                     'vcid': demuxer_instance.currentVCID
                 }
 
+        elif path[0] == "stats" and len(path) == 2 and path[1] == "memory" and demuxer_instance.memory != None:
+            content = demuxer_instance.memory.state()
+
+        elif path[0] == "stats" and len(path) == 2 and path[1] == "latency":
+            content = {
+                'stages': demuxer_instance.latency.percentiles(),
+                'products': demuxer_instance.productLatency.percentiles()
+            }
+
+        elif path[0] == "stats" and len(path) == 2 and path[1] == "history":
+            try:
+                start = self.get_int("start")
+                end = self.get_int("end")
+                res = { None: None, "second": 1, "minute": 60 }[self.query.get("res", [None])[0]]
+                content = demuxer_instance.history.get(start, end, res)
+            except (ValueError, KeyError):
+                content = b''
+                status = 400
+
+        elif path[0] == "schedule" and len(path) == 1:
+            content = demuxer_instance.schedule.state()
+
+        elif path[0] == "products" and len(path) == 1:
+            content = demuxer_instance.products.state()
+
+        elif path[0] == "preview" and demuxer_instance.products.previews != None:
+            previews = demuxer_instance.products.previews
+
+            if len(path) == 1:
+                content = previews.state()
+            elif len(path) == 2 and previews.get(path[1]) != None:
+                content = previews.get(path[1])
+                mime = "image/jpeg"
+
         elif path[0] == "latest" and len(path) == 2:
             if path[1] == "image":
                 content = {
@@ -155,7 +847,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 }
         
         # Send HTTP 200 OK if content has been updated
-        if content != b'': status = 200
+        if content != b'' and status == 404: status = 200
 
         # Convert Python dict into JSON string
         if type(content) is dict:
@@ -165,6 +857,15 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         return content, status, mime
 
 
+    def get_int(self, name):
+        """
+        Returns integer query parameter (None if not present)
+        """
+
+        value = self.query.get(name)
+        return None if value == None else int(value[0])
+
+
     def log_message(self, format, *args):
         """
         Silence HTTP server log messages
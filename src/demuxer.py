@@ -6,12 +6,18 @@ https://github.com/sam210723/xrit-rx
 from collections import deque, namedtuple
 import colorama
 from colorama import Fore, Back, Style
-from time import sleep
+from time import perf_counter, sleep, time
 from threading import Thread
 import sys
 
 import ccsds as CCSDS
+import events
+import history
+import memdiag
+import metrics
 import products
+import schedule
+import tracer
 
 
 class Demuxer:
@@ -29,10 +35,51 @@ class Demuxer:
         self.rxq = deque()              # Data receive queue
         self.coreReady = False          # Core thread ready state
         self.coreStop = False           # Core thread stop flag
+        self.coreThread = None          # Core thread
         self.channels = {}              # List of channel handlers
         self.currentVCID = None         # Current Virtual Channel ID
         self.lastImage = None           # Last image output by demuxer
         self.lastXRIT = None            # Last xRIT file output by demuxer
+        self.lastCheck = time()         # Last product timeout check
+        self.events = events.Events()   # Event publisher
+        self.schedule = schedule.Schedule(self.config.output + "schedule.json")
+        self.metrics = metrics.Metrics()  # Pipeline metrics
+
+        # Open product manager
+        self.products = products.Manager(
+            self.config.timeout,
+            self.config.memory * 1024 * 1024,
+            self.product_saved,
+            self.config.preview,
+            self.events
+        )
+
+        # Register pipeline metrics
+        m = self.metrics
+        m.counter("xrit_vcdus_total", "VCDUs received", "vcid")
+        m.counter("xrit_vcdus_discarded_total", "VCDUs discarded before demultiplexing", "reason")
+        m.counter("xrit_vcdus_dropped_total", "VCDUs missing according to continuity counter", "vcid")
+        m.counter("xrit_continuity_errors_total", "Gaps in VCDU continuity counter", "vcid")
+        m.counter("xrit_cppdus_total", "CP_PDUs finished")
+        m.counter("xrit_cppdu_errors_total", "CP_PDUs with length or CRC errors", "error")
+        m.counter("xrit_tp_files_total", "TP_Files finished or skipped due to dropped packets", "status")
+        m.counter("xrit_decrypt_errors_total", "S_PDUs with unknown encryption key index")
+        m.counter("xrit_bytes_total", "Bytes of xRIT files decoded")
+        m.counter("xrit_products_saved_total", "Product files saved", "mode")
+        m.gauge("xrit_rx_queue_depth", "VCDUs waiting in receive queue", lambda: len(self.rxq))
+        m.gauge("xrit_open_products", "Products being assembled", lambda: len(self.products.products))
+        m.gauge("xrit_open_product_bytes", "Bytes held by products being assembled", self.products.size)
+        m.histogram("xrit_stage_seconds", "Processing time per item (vcdu includes xrit, xrit includes product)", "stage")
+
+        # Latency from VCDU arrival to each stage finishing, and to product files being saved
+        self.latency = metrics.Latency(m, "xrit_latency_seconds", "Time from arrival of last VCDU to stage finishing", "stage")
+        self.productLatency = metrics.Latency(m, "xrit_product_latency_seconds", "Time from arrival of last VCDU to product file saved", "mode")
+
+        # Statistics history
+        self.history = history.History(self.metrics, lambda: len(self.rxq))
+
+        # Memory diagnostics
+        self.memory = memdiag.Diagnostics(self, self.config.memdiag) if self.config.memdiag else None
 
         if self.config.downlink == "LRIT":
             self.coreWait = 54          # Core loop delay in ms for LRIT (108.8ms per packet @ 64 kbps)
@@ -44,6 +91,7 @@ class Demuxer:
         demux_thread.name = "DEMUX CORE"
         demux_thread.run = self.demux_core
         demux_thread.start()
+        self.coreThread = demux_thread
 
     def demux_core(self):
         """
@@ -56,6 +104,9 @@ class Demuxer:
         # Thread globals
         lastVCID = None                         # Last VCID seen
         crclut = CCSDS.CP_PDU.CCITT_LUT(None)   # CP_PDU CRC LUT
+        counters = self.metrics.counters        # Metric counters
+        batch = 0                               # VCDUs in current trace batch
+        batchStart = None                       # Start time of current trace batch
         
         # Open VCDU dump file
         dumpf = None
@@ -65,15 +116,30 @@ class Demuxer:
         # Thread loop
         while not self.coreStop:
             # Pull next packet from queue
-            packet = self.pull()
+            item = self.pull()
+
+            # Trace VCDUs processed between idle periods in batches
+            if tracer.enabled:
+                if batch and (item == None or batch == 256):
+                    tracer.complete("VCDU batch", "demux", batchStart, args={ 'vcdus': batch, 'queue': len(self.rxq) })
+                    batch = 0
+                if item != None:
+                    if not batch: batchStart = perf_counter()
+                    batch += 1
             
             # If queue is not empty
-            if packet != None:
+            if item != None:
+                packet, arrived = item
+                self.latency.record("queue", perf_counter() - arrived)
+
                 # Parse VCDU
-                vcdu = CCSDS.VCDU(packet)
+                vcdu = CCSDS.VCDU(packet, arrived)
+                counters[("xrit_vcdus_total", vcdu.VCID)] += 1
 
                 # Set current VCID
-                self.currentVCID = vcdu.VCID
+                if self.currentVCID != vcdu.VCID:
+                    self.currentVCID = vcdu.VCID
+                    self.events.publish("vcid", { 'vcid': vcdu.VCID })
 
                 # Dump raw VCDU to file
                 if dumpf != None:
@@ -87,15 +153,16 @@ class Demuxer:
 
                 # Check spacecraft is supported
                 if vcdu.SC != "GK-2A":
+                    counters[("xrit_vcdus_discarded_total", "spacecraft")] += 1
                     if self.config.verbose:
                         print(Fore.WHITE + Back.RED + Style.BRIGHT + "SPACECRAFT \"{}\" NOT SUPPORTED".format(vcdu.SCID))
                     continue
 
                 # Check for VCID change
                 if lastVCID != vcdu.VCID:
-                    # Notify channel handlers of VCID change
-                    for c in self.channels:
-                        self.channels[c].notify(vcdu.VCID)
+                    # Notify previously active channel handler of VCID change
+                    if lastVCID in self.channels:
+                        self.channels[lastVCID].notify(vcdu.VCID)
                     
                     # Print VCID info
                     if self.config.verbose: print()
@@ -105,28 +172,50 @@ class Demuxer:
                     lastVCID = vcdu.VCID
 
                 # Discard fill packets
-                if vcdu.VCID == 63: continue
+                if vcdu.VCID == 63:
+                    counters[("xrit_vcdus_discarded_total", "fill")] += 1
+                    continue
                 
                 # Discard VCDUs in blacklisted VCIDs
-                if vcdu.VCID in self.config.blacklist: continue
+                if vcdu.VCID in self.config.blacklist:
+                    counters[("xrit_vcdus_discarded_total", "blacklist")] += 1
+                    continue
 
                 # Check channel handler for current VCID exists
                 try:
                     self.channels[vcdu.VCID]
                 except KeyError:
                     # Create new channel handler instance
-                    ccfg = namedtuple('ccfg', 'spacecraft downlink verbose dump output images xrit blacklist keys VCID lut')
+                    ccfg = namedtuple('ccfg', self.config._fields + ('VCID', 'lut'))
                     self.channels[vcdu.VCID] = Channel(ccfg(*self.config, vcdu.VCID, crclut), self)
                     if self.config.verbose: print("  " + Fore.GREEN + Style.BRIGHT + "CREATED NEW CHANNEL HANDLER\n")
 
                 # Pass VCDU to appropriate channel handler
+                start = perf_counter()
                 self.channels[vcdu.VCID].data_in(vcdu)
+                self.metrics.observe("xrit_stage_seconds", perf_counter() - start, "vcdu")
             else:
                 # No packet available, sleep thread
                 sleep(self.coreWait / 1000)
+
+            # Check for timed out products once per second
+            if time() - self.lastCheck >= 1:
+                self.products.check()
+                self.history.sample()
+                self.lastCheck = time()
+
+                # Pre-warm resources ahead of scheduled full disk transmissions
+                if self.config.prewarm:
+                    if self.schedule.upcoming(["FD"], self.config.prewarm):
+                        self.products.prewarm(self.config)
+                    else:
+                        self.products.release()
         
         # Gracefully exit core thread
         if self.coreStop:
+            # Save unfinished products
+            self.products.flush()
+
             if dumpf != None:
                 dumpf.close()
             return
@@ -137,11 +226,14 @@ class Demuxer:
         :param packet: 892 byte Virtual Channel Data Unit (VCDU)
         """
 
-        self.rxq.append(packet)
+        self.rxq.append((packet, perf_counter()))
 
     def pull(self):
         """
         Pull data from receive queue
+
+        Returns:
+            tuple -- VCDU and arrival time (perf_counter), None if queue is empty
         """
 
         try:
@@ -151,6 +243,23 @@ class Demuxer:
             # Queue empty
             return None
 
+    def product_saved(self, product):
+        """
+        Handles files saved by the product manager
+        """
+
+        self.lastImage = product.last
+        self.events.publish("image", { 'image': product.last })
+        self.metrics.inc("xrit_products_saved_total", product.name.mode)
+        if product.arrived != None: self.productLatency.record(product.name.mode, perf_counter() - product.arrived)
+
+        # Update transmission schedule from received DOP
+        if isinstance(product, products.AlphanumericText) and product.dop:
+            date = "{2}{1}{0}".format(*product.name.date)
+            if self.schedule.update(date, product.payload):
+                print("    " + Fore.GREEN + Style.BRIGHT + "Updated schedule ({} entries)".format(len(self.schedule.entries)))
+                self.events.publish("schedule", { 'received': self.schedule.received })
+
     def complete(self):
         """
         Checks if receive queue is empty
@@ -180,8 +289,8 @@ class Channel:
         self.counter = -1           # VCDU continuity counter
         self.cCPPDU = None          # Current CP_PDU object
         self.cTPFile = None         # Current TP_File object
-        self.cProduct = None        # Current product object
         self.demuxer = parent       # Demuxer class instance (parent)
+        self.arrived = None         # Arrival time of current VCDU (perf_counter)
 
 
     def data_in(self, vcdu):
@@ -192,6 +301,7 @@ class Channel:
 
         # Check VCDU continuity counter
         self.continuity(vcdu)
+        self.arrived = vcdu.arrived
 
         # Parse M_PDU
         mpdu = CCSDS.M_PDU(vcdu.MPDU)
@@ -215,7 +325,7 @@ class Channel:
 
                 try:
                     lenok, crcok = self.cCPPDU.finish(preptr, self.config.lut)
-                    if self.config.verbose: self.check_CPPDU(lenok, crcok)
+                    self.check_CPPDU(lenok, crcok)
 
                     # Handle finished CP_PDU
                     self.handle_CPPDU(self.cCPPDU)
@@ -238,7 +348,7 @@ class Channel:
                     
                     try:
                         lenok, crcok = self.cCPPDU.finish(b'', self.config.lut)
-                        if self.config.verbose: self.check_CPPDU(lenok, crcok)
+                        self.check_CPPDU(lenok, crcok)
 
                         # Handle finished CP_PDU
                         self.handle_CPPDU(self.cCPPDU)
@@ -279,6 +389,17 @@ class Channel:
         sys.stdout.flush()
     
 
+    def size(self):
+        """
+        Returns number of bytes held by unfinished CP_PDU and TP_File
+        """
+
+        size = 0
+        if self.cCPPDU != None and self.cCPPDU.PAYLOAD != None: size += len(self.cCPPDU.PAYLOAD)
+        if self.cTPFile != None and self.cTPFile.PAYLOAD != None: size += len(self.cTPFile.PAYLOAD)
+        return size
+
+
     def continuity(self, vcdu):
         """
         Checks VCDU packet continuity by comparing packet counters
@@ -293,6 +414,9 @@ class Channel:
             
             diff = vcdu.COUNTER - self.counter - 1
             if diff > 0:
+                self.demuxer.metrics.inc("xrit_vcdus_dropped_total", vcdu.VCID, diff)
+                self.demuxer.metrics.inc("xrit_continuity_errors_total", vcdu.VCID)
+
                 if self.config.verbose:
                     print("  " + Fore.WHITE + Back.RED + Style.BRIGHT + "DROPPED {} PACKET{}    (CURRENT: {}   LAST: {}   VCID: {})".format(diff, "S" if diff > 1 else "", vcdu.COUNTER, self.counter, vcdu.VCID))
                 else:
@@ -306,6 +430,15 @@ class Channel:
         Checks length and CRC of finished CP_PDU
         """
 
+        m = self.demuxer.metrics
+        m.inc("xrit_cppdus_total")
+        self.cCPPDU.arrived = self.arrived
+        if self.arrived != None: self.demuxer.latency.record("cp_pdu", perf_counter() - self.arrived)
+        if not lenok: m.inc("xrit_cppdu_errors_total", "length")
+        if not crcok: m.inc("xrit_cppdu_errors_total", "crc")
+
+        if not self.config.verbose: return
+
         # Show length error
         if lenok:
             print("\n    " + Fore.GREEN + Style.BRIGHT + "LENGTH:     OK")
@@ -339,8 +472,12 @@ class Channel:
         elif cppdu.SEQ == cppdu.Sequence.LAST:
             # Close current TP_File
             lenok = self.cTPFile.finish(cppdu.PAYLOAD[:-2])
+            self.cTPFile.arrived = cppdu.arrived
+            if cppdu.arrived != None: self.demuxer.latency.record("tp_file", perf_counter() - cppdu.arrived)
 
             if self.config.verbose: self.cTPFile.print_info()
+            self.demuxer.metrics.inc("xrit_tp_files_total", "complete" if lenok else "skipped")
+
             if lenok:
                 if self.config.verbose: print("    " + Fore.GREEN + Style.BRIGHT + "LENGTH:     OK\n")
                 
@@ -379,33 +516,33 @@ class Channel:
         Processes complete S_PDUs to build xRIT and Image files
         """
 
+        start = perf_counter()
+        if spdu.failed: self.demuxer.metrics.inc("xrit_decrypt_errors_total")
+        self.demuxer.metrics.inc("xrit_bytes_total", n=len(spdu.PLAINTEXT))
+
         # Create new xRIT object
         xrit = CCSDS.xRIT(spdu.PLAINTEXT)
+        xrit.arrived = self.arrived
 
         # Save xRIT file if enabled
         if self.config.xrit:
             xrit.save(self.config.output)
             self.demuxer.lastXRIT = xrit.get_save_path(self.config.output)
+            self.demuxer.events.publish("xrit", { 'xrit': self.demuxer.lastXRIT })
 
         # Save image file if enabled
         if self.config.images:
-            # Create new product
-            if self.cProduct == None:
-                self.cProduct = products.new(self.config, xrit.FILE_NAME)
-                self.cProduct.print_info()
-            
-            # Add data to current product
-            self.cProduct.add(xrit)
-
-            # Save and clear complete product
-            if self.cProduct.complete:
-                self.cProduct.save()
-                self.demuxer.lastImage = self.cProduct.last
-                self.cProduct = None
+            # Add data to open product for this channel
+            pstart = perf_counter()
+            self.demuxer.products.add(self.config.VCID, self.config, xrit)
+            self.demuxer.metrics.observe("xrit_stage_seconds", perf_counter() - pstart, "product")
         else:
             # Print XRIT file info
             xrit.print_info(self.config.verbose)
 
+        self.demuxer.metrics.observe("xrit_stage_seconds", perf_counter() - start, "xrit")
+        if xrit.arrived != None: self.demuxer.latency.record("xrit", perf_counter() - xrit.arrived)
+
 
     def notify(self, vcid):
         """
@@ -431,7 +568,3 @@ class Channel:
 
                 # Clear finished TP_File
                 self.cTPFile = None
-            elif self.cProduct != None:
-                # Save and clear current product
-                self.cProduct.save()
-                self.cProduct = None
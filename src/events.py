@@ -0,0 +1,97 @@
+"""
+events.py
+https://github.com/sam210723/xrit-rx
+
+Publishes demuxer events to dashboard clients
+"""
+
+from collections import OrderedDict
+from threading import Condition, Lock
+
+
+class Events:
+    """
+    Publishes events to subscribers, coalescing events which arrive faster than subscribers can take them
+    """
+
+    def __init__(self):
+        """
+        Initialises event publisher
+        """
+
+        self.subscribers = []           # List of subscriber objects
+        self.lock = Lock()              # Lock for subscriber list
+        self.count = 0                  # Number of events published
+
+    def publish(self, event, data, key=None):
+        """
+        Publishes event to all subscribers
+
+        Arguments:
+            event {string} -- Event type
+            data {dict} -- Event data (JSON serialisable)
+            key {string} -- Events with the same type and key replace each other until sent
+        """
+
+        self.count += 1
+        if not self.subscribers: return
+
+        with self.lock:
+            for s in self.subscribers:
+                s.put(event, data, key)
+
+    def subscribe(self):
+        """
+        Adds new subscriber
+        """
+
+        s = Subscriber()
+        with self.lock: self.subscribers.append(s)
+        return s
+
+    def unsubscribe(self, s):
+        """
+        Removes subscriber
+        """
+
+        with self.lock:
+            if s in self.subscribers: self.subscribers.remove(s)
+
+
+class Subscriber:
+    """
+    Queue of unsent events for a single subscriber
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()    # Latest unsent data by event type and key
+        self.cond = Condition()         # Pending events available condition
+
+    def put(self, event, data, key=None):
+        """
+        Adds event to pending events, replacing any unsent event of the same type and key
+        """
+
+        with self.cond:
+            self.pending.pop((event, key), None)
+            self.pending[(event, key)] = data
+            self.cond.notify()
+
+    def get(self, timeout):
+        """
+        Waits for pending events
+
+        Arguments:
+            timeout {float} -- Maximum time to wait in seconds
+
+        Returns:
+            list -- List of (event, data) tuples (empty on timeout)
+        """
+
+        with self.cond:
+            if not self.pending: self.cond.wait(timeout)
+
+            events = [(k[0], d) for k, d in self.pending.items()]
+            self.pending.clear()
+
+        return events
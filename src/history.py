@@ -0,0 +1,134 @@
+"""
+history.py
+https://github.com/sam210723/xrit-rx
+
+Fixed size history of link and pipeline statistics
+"""
+
+from collections import deque
+from threading import Lock
+from time import time
+
+
+class History:
+    """
+    Per-second and per-minute ring buffers of statistics sampled from pipeline metrics
+
+    Per-second samples cover the last hour and are summed into per-minute samples covering the last 24 hours.
+    """
+
+    # Series sampled from metric counters (series name, counter name, label value or None for all labels)
+    counters = (
+        ("dropped", "xrit_vcdus_dropped_total", None),
+        ("crc", "xrit_cppdu_errors_total", "crc"),
+        ("bytes", "xrit_bytes_total", None),
+        ("products", "xrit_products_saved_total", None)
+    )
+
+    def __init__(self, metrics, queue, seconds=3600, minutes=1440):
+        """
+        Initialises history buffers
+
+        Arguments:
+            metrics {metrics.Metrics} -- Pipeline metrics to sample
+            queue {function} -- Returns current receive queue depth
+            seconds {int} -- Number of per-second samples to keep
+            minutes {int} -- Number of per-minute samples to keep
+        """
+
+        self.metrics = metrics
+        self.queue = queue
+        self.seconds = deque(maxlen=seconds)    # Per-second samples
+        self.minutes = deque(maxlen=minutes)    # Per-minute samples
+        self.minute = None                      # Per-minute sample being accumulated
+        self.last = self.totals()               # Counter totals at last sample
+        self.lock = Lock()                      # Lock for sample buffers
+
+    def totals(self):
+        """
+        Returns current counter totals (VCDUs per VCID and each counter series)
+        """
+
+        vcids = {}
+        values = dict.fromkeys([c[0] for c in self.counters], 0)
+
+        for (name, value), count in list(self.metrics.counters.items()):
+            if name == "xrit_vcdus_total":
+                vcids[value] = count
+                continue
+
+            for series, cname, label in self.counters:
+                if name == cname and (label == None or label == value):
+                    values[series] += count
+
+        return vcids, values
+
+    def sample(self):
+        """
+        Records change in counters since the last sample
+        """
+
+        now = int(time())
+        vcids, values = self.totals()
+        lastv, lastc = self.last
+        self.last = (vcids, values)
+
+        s = {
+            'time': now,
+            'vcid': { v: c - lastv.get(v, 0) for v, c in vcids.items() if c != lastv.get(v, 0) },
+            'queue': self.queue()
+        }
+        for k in values: s[k] = values[k] - lastc[k]
+
+        with self.lock:
+            self.seconds.append(s)
+
+            # Add sample to current minute (queue depth is the maximum over the minute)
+            start = now - now % 60
+            if self.minute != None and self.minute['time'] != start:
+                self.minutes.append(self.minute)
+                self.minute = None
+
+            if self.minute == None:
+                self.minute = dict(s, time=start, vcid=dict(s['vcid']))
+            else:
+                for k in values: self.minute[k] += s[k]
+                for v, c in s['vcid'].items(): self.minute['vcid'][v] = self.minute['vcid'].get(v, 0) + c
+                self.minute['queue'] = max(self.minute['queue'], s['queue'])
+
+    def get(self, start=None, end=None, resolution=None):
+        """
+        Returns samples in a time range as arrays
+
+        Arguments:
+            start {int} -- Start of range (UNIX timestamp, default oldest sample)
+            end {int} -- End of range (UNIX timestamp, default newest sample)
+            resolution {int} -- Seconds per sample (1 or 60, default 1 if range is within per-second history, otherwise 60)
+
+        Returns:
+            dict -- Sample times and one array per series (VCDUs as one array per VCID)
+        """
+
+        with self.lock:
+            if resolution == None:
+                if start == None:
+                    # Whole history is within per-second samples until the buffer starts discarding them
+                    resolution = 1 if len(self.seconds) < self.seconds.maxlen else 60
+                else:
+                    oldest = self.seconds[0]['time'] if self.seconds else 0
+                    resolution = 1 if start >= oldest else 60
+
+            samples = list(self.seconds) if resolution == 1 else list(self.minutes) + ([self.minute] if self.minute else [])
+
+        samples = [s for s in samples if (start == None or s['time'] >= start) and (end == None or s['time'] <= end)]
+        vcids = sorted(set(v for s in samples for v in s['vcid']))
+
+        data = {
+            'resolution': resolution,
+            'time': [s['time'] for s in samples],
+            'vcdus': { v: [s['vcid'].get(v, 0) for s in samples] for v in vcids },
+            'queue': [s['queue'] for s in samples]
+        }
+        for c in self.counters: data[c[0]] = [s[c[0]] for s in samples]
+
+        return data
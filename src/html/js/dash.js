@@ -42,8 +42,12 @@ var vchans = {
     }
 };
 var sch = [];
+var sch_received;
 var current_vcid;
 var latest_image;
+var latest_preview;
+var streaming = false;
+var state_timer = null;
 var utc_date;
 
 function init()
@@ -106,6 +110,9 @@ function configure()
     }, 100);
     block_time(blocks.time.body);
 
+    // Subscribe to event stream
+    if (window.EventSource) { stream(); }
+
     // Setup polling loop
     setInterval(poll, config.interval * 1000);
     poll();
@@ -120,120 +127,145 @@ function configure()
  */
 function poll()
 {
-    // Get current VCID
-    http_get("/api/current/vcid", (res) => {
-        if (res.status == 200) {
-            res.json().then((data) => {
-                current_vcid = data['vcid'];
-            });
+    // Event stream delivers updates while connected
+    if (!streaming) {
+        get_state();
+    }
+
+    update();
+}
+
+
+/**
+ * Call update function for each block
+ */
+function update()
+{
+    for (var block in blocks) {
+        if (blocks[block].update != null) {
+            blocks[block].update(blocks[block].body);
         }
-        else {
-            print("Failed to get current VCID", "POLL");
-            return false;
+    }
+}
+
+
+/**
+ * Subscribe to xrit-rx event stream (falls back to polling while disconnected)
+ */
+function stream()
+{
+    var source = new EventSource("/api/events");
+
+    source.onopen = () => {
+        streaming = true;
+        print("Connected to event stream", "EVNT");
+    };
+
+    source.onerror = () => {
+        // EventSource reconnects automatically
+        streaming = false;
+    };
+
+    source.addEventListener("vcid", (e) => {
+        current_vcid = JSON.parse(e.data)['vcid'];
+        update();
+    });
+
+    source.addEventListener("image", (e) => {
+        latest_image = JSON.parse(e.data)['image'];
+        get_state();
+        update();
+    });
+
+    source.addEventListener("schedule", (e) => {
+        get_schedule();
+    });
+
+    source.addEventListener("progress", (e) => {
+        // Progress is published for every segment, so only refresh previews once per interval
+        if (config.preview > 0 && state_timer == null) {
+            state_timer = setTimeout(() => {
+                state_timer = null;
+                get_state();
+            }, config.interval * 1000);
         }
     });
+}
+
 
-    // Get last image
-    http_get("/api/latest/image", (res) => {
+/**
+ * Get combined demuxer state (VCID, latest image and progressive previews) in one request
+ */
+function get_state()
+{
+    http_get("/api/state", (res) => {
         if (res.status == 200) {
             res.json().then((data) => {
+                current_vcid = data['vcid'];
                 latest_image = data['image'];
+
+                // Reload schedule when a new Daily Operation Plan is received
+                if (config.spacecraft == "GK-2A" && data['schedule'] != sch_received) { get_schedule(); }
+
+                // Use most recently updated channel preview
+                latest_preview = null;
+                for (var chan in data['previews']) {
+                    var p = data['previews'][chan];
+                    if (!latest_preview || p.updated > latest_preview.updated) {
+                        latest_preview = p;
+                        latest_preview.channel = chan;
+                    }
+                }
+                update();
             });
         }
         else {
-            print("Failed to get last image", "POLL");
+            print("Failed to get state", "POLL");
             return false;
         }
     });
-
-    // Call update function for each block
-    for (var block in blocks) {
-        if (blocks[block].update != null) {
-            blocks[block].update(blocks[block].body);
-        }
-    }
 }
 
 
 /**
- * Download and parse schedule
+ * Get schedule parsed by xrit-rx from received Daily Operation Plans
  */
 function get_schedule()
 {
-    // Get UTC date
-    var d = new Date();
-    utc_date = `${d.getUTCFullYear()}${(d.getUTCMonth()+1).toString().padStart(2, "0")}${d.getUTCDate().toString().padStart(2, "0")}`;
-
-    /**
-     * Schedule download is proxied through my web server at vksdr.com because KMA 
-     * have not included CORS headers in their API. Mordern browsers will disallow 
-     * cross-domain requests unless these headers are present. The PHP backend of 
-     * my web server will make the request to the KMA API then return the result to 
-     * the dashboard with the necesary CORS headers.
-     * 
-     * See https://developer.mozilla.org/en-US/docs/Web/HTTP/CORS
-     */
-
-    // Build request URL
-    var url = "https://vksdr.com/scripts/kma-dop.php";
-    var params = `?searchDate=${utc_date}&searchType=${config.downlink}`;
-
-    http_get(url + params, (res) => {
+    http_get("/api/schedule", (res) => {
         if (res.status == 200) {
             res.json().then((data) => {
-                var raw = data['data'];
-                var start = -1;
-                var end = -1;
-
-                // Find start and end of DOP
-                for (var i in raw) {
-                    var line = raw[i].trim();
-
-                    if (line.startsWith("TIME(UTC)")) {
-                        start = parseInt(i) + 1;
-                    }
-
-                    if (line.startsWith("ABBREVIATIONS:")) {
-                        end = parseInt(i) - 2;
-                    }
-                }
-
-                // Loop through schedule entries
-                for (var i = start; i <= end; i++) {
-                    var line = raw[i].trim().split('\t');
-                    var entry = [];
-
-                    entry[0] = line[0].substring(0, line[0].indexOf("-"));
-                    entry[1] = line[0].substring(line[0].indexOf("-") + 1);
-                    entry[2] = line[1].substring(0, line[1].length - 3);
-                    entry[3] = line[1].substring(line[1].length - 3);
-                    entry[4] = line[2];
-                    entry[5] = line[3] == "O";
-
-                    if (entry[2] == "EGMSG") { continue; }   // Skip EGMSG
-
-                    sch.push(entry);
-                }
+                sch = data['entries'];
+                sch_received = data['received'];
+                utc_date = data['date'];
 
                 // Create schedule table
-                var table = document.createElement("table");
-                table.className = "schedule";
-                table.appendChild(document.createElement("tbody"));
-
-                // Table header
-                var header = table.createTHead();
-                var row = header.insertRow(0);
-                row.insertCell(0).innerHTML = "Start (UTC)";
-                row.insertCell(1).innerHTML = "End (UTC)";
-                row.insertCell(2).innerHTML = "Type";
-                row.insertCell(3).innerHTML = "ID";
-
-                // Add table to document
                 var element = blocks['schedule'].body;
-                element.innerHTML = "";
-                element.appendChild(table);
+                if (element.children.length == 0 || element.children[0].tagName != "TABLE") {
+                    var table = document.createElement("table");
+                    table.className = "schedule";
+                    table.appendChild(document.createElement("tbody"));
+
+                    // Table header
+                    var header = table.createTHead();
+                    var row = header.insertRow(0);
+                    row.insertCell(0).innerHTML = "Start (UTC)";
+                    row.insertCell(1).innerHTML = "End (UTC)";
+                    row.insertCell(2).innerHTML = "Type";
+                    row.insertCell(3).innerHTML = "ID";
+
+                    // Add table to document
+                    element.innerHTML = "";
+                    element.appendChild(table);
+                }
 
-                print("Ready", "SCHD");
+                if (sch.length == 0) {
+                    element.children[0].children[1].innerHTML = "<tr><td colspan=\"4\">Waiting for Daily Operation Plan...</td></tr>";
+                }
+                else {
+                    print(`Loaded ${sch.length} entries for ${utc_date}`, "SCHD");
+                }
+                block_schedule(element);
             });
         }
         else {
@@ -308,7 +340,17 @@ function block_latestimg(element)
     var link = element.children[0];
     var cap = element.children[2];
 
-    if (latest_image) {
+    if (latest_preview) {
+        var url = `/api/preview/${latest_preview.channel}?${latest_preview.updated}`;
+
+        // Only update image element if preview has changed
+        if (img.getAttribute("src") != url) {
+            img.setAttribute("src", url);
+            link.setAttribute("href", url);
+            cap.innerText = `${latest_preview.name} (preview ${latest_preview.segments}/${latest_preview.total})`;
+        }
+    }
+    else if (latest_image) {
         var url = `/api/${latest_image}`;
         var fname = url.split('/');
         fname = fname[fname.length - 1];
@@ -317,10 +359,19 @@ function block_latestimg(element)
 
         // Set <img> src attribute
         if (ext != "txt") {
+            // Load resized image sized for the block, link to full resolution image
+            var thumb = `/api/thumbnail/${latest_image}?width=${blocks.latestimg.width}`;
+
+            // Open tile viewer for multi-segment images when tiles are enabled
+            var href = url;
+            if (config.tiles && latest_image.indexOf("/FD/") > -1) {
+                href = `/viewer.html?dzi=${url.substring(0, url.lastIndexOf("."))}.dzi`;
+            }
+
             // Only update image element if URL has changed
-            if (img.getAttribute("src") != url) {
-                img.setAttribute("src", url);
-                link.setAttribute("href", url);
+            if (img.getAttribute("src") != thumb) {
+                img.setAttribute("src", thumb);
+                link.setAttribute("href", href);
                 cap.innerText = fname;
             }
         }
@@ -351,10 +402,11 @@ function block_schedule(element)
     var header = element.parentNode.children[0];
     header.innerHTML = `${config.spacecraft} ${config.downlink} Schedule`;
 
-    // Check UTC date
+    // Mark schedule from a previous day as out of date
     var d = new Date();
-    if (utc_date != `${d.getUTCFullYear()}${(d.getUTCMonth()+1).toString().padStart(2, "0")}${d.getUTCDate().toString().padStart(2, "0")}`) {
-        location.reload();
+    var today = `${d.getUTCFullYear()}${(d.getUTCMonth()+1).toString().padStart(2, "0")}${d.getUTCDate().toString().padStart(2, "0")}`;
+    if (utc_date != today) {
+        header.innerHTML += ` <span title="Waiting for today's Daily Operation Plan">(${utc_date})</span>`;
     }
     
     // Get current UTC time
@@ -364,10 +416,10 @@ function block_schedule(element)
     var body = element.children[0].children[1];
 
     // Find first entry to add to table
-    var first;
+    var first = Math.max(0, sch.length - 12);
     for (var entry in sch) {
-        var start = sch[entry][0];
-        var end = sch[entry][1];
+        var start = sch[entry].start;
+        var end = sch[entry].end;
 
         if (time < start) {
             first = Math.max(0, parseInt(entry) - 3);
@@ -380,15 +432,15 @@ function block_schedule(element)
         // Limit index
         if (i >= sch.length) { break; }
 
-        var start = sch[i][0];
-        var end = sch[i][1];
+        var start = sch[i].start;
+        var end = sch[i].end;
         var row = body.insertRow();
 
         // Add cells to row
-        row.insertCell().innerHTML = `${sch[i][0].substr(0, 2)}:${sch[i][0].substr(2, 2)}:${sch[i][0].substr(4, 2)}`;
-        row.insertCell().innerHTML = `${sch[i][1].substr(0, 2)}:${sch[i][1].substr(2, 2)}:${sch[i][1].substr(4, 2)}`;
-        row.insertCell().innerHTML = sch[i][2];
-        row.insertCell().innerHTML = sch[i][3];
+        row.insertCell().innerHTML = `${sch[i].start.substr(0, 2)}:${sch[i].start.substr(2, 2)}:${sch[i].start.substr(4, 2)}`;
+        row.insertCell().innerHTML = `${sch[i].end.substr(0, 2)}:${sch[i].end.substr(2, 2)}:${sch[i].end.substr(4, 2)}`;
+        row.insertCell().innerHTML = sch[i].type;
+        row.insertCell().innerHTML = sch[i].id;
 
         // Set past entries as disabled (except last entry)
         if (time > start && i != sch.length - 1) {
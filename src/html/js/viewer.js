@@ -0,0 +1,170 @@
+'use strict';
+/**
+ *  viewer.js
+ *  https://github.com/sam210723/xrit-rx
+ *  
+ *  Pan and zoom viewer for Deep Zoom (DZI) tile pyramids
+ */
+
+var dzi = {};           // Image properties from DZI descriptor
+var view = {            // Current view (image pixels per screen pixel and top-left offset)
+    fit: 1,
+    scale: 1,
+    x: 0,
+    y: 0
+};
+var tiles = {};         // Tile <img> elements by level and position
+var viewer;             // Viewer element
+var drag = null;        // Last mouse position while dragging
+
+function init()
+{
+    viewer = document.getElementById("viewer");
+
+    // Get DZI descriptor path from query string
+    var url = new URLSearchParams(window.location.search).get("dzi");
+    if (!url) {
+        print("No image specified", "VIEW");
+        return;
+    }
+
+    var name = url.split("/").pop().replace(".dzi", "");
+    document.getElementById("dash-heading").innerText = name;
+    document.title = `${name} - xrit-rx`;
+
+    http_get(url, (res) => {
+        if (res.status == 200) {
+            res.text().then((data) => {
+                var xml = new DOMParser().parseFromString(data, "text/xml");
+                var image = xml.getElementsByTagName("Image")[0];
+                var size = xml.getElementsByTagName("Size")[0];
+
+                dzi.width = parseInt(size.getAttribute("Width"));
+                dzi.height = parseInt(size.getAttribute("Height"));
+                dzi.tile = parseInt(image.getAttribute("TileSize"));
+                dzi.format = image.getAttribute("Format");
+                dzi.files = url.replace(".dzi", "_files");
+                dzi.levels = Math.ceil(Math.log2(Math.max(dzi.width, dzi.height))) + 1;
+
+                configure();
+                print("Ready", "VIEW");
+            });
+        }
+        else {
+            print("Failed to get tile descriptor", "VIEW");
+            return false;
+        }
+    });
+}
+
+
+/**
+ * Set up viewer element and input handlers
+ */
+function configure()
+{
+    viewer.style.position = "relative";
+    viewer.style.overflow = "hidden";
+    viewer.style.height = `${window.innerHeight - viewer.offsetTop}px`;
+    viewer.style.background = "black";
+    viewer.style.cursor = "grab";
+
+    // Fit whole image in viewer
+    view.fit = Math.max(dzi.width / viewer.clientWidth, dzi.height / viewer.clientHeight);
+    view.scale = view.fit;
+    view.x = (dzi.width - viewer.clientWidth * view.scale) / 2;
+    view.y = (dzi.height - viewer.clientHeight * view.scale) / 2;
+
+    // Zoom around mouse position
+    viewer.addEventListener("wheel", (e) => {
+        e.preventDefault();
+        var factor = e.deltaY > 0 ? 1.25 : 0.8;
+        var scale = Math.min(Math.max(view.scale * factor, 0.25), view.fit * 2);
+        var rect = viewer.getBoundingClientRect();
+        var mx = e.clientX - rect.left;
+        var my = e.clientY - rect.top;
+
+        view.x += mx * (view.scale - scale);
+        view.y += my * (view.scale - scale);
+        view.scale = scale;
+        render();
+    });
+
+    // Pan by dragging
+    viewer.addEventListener("mousedown", (e) => {
+        drag = [e.clientX, e.clientY];
+        viewer.style.cursor = "grabbing";
+    });
+    window.addEventListener("mouseup", () => {
+        drag = null;
+        viewer.style.cursor = "grab";
+    });
+    window.addEventListener("mousemove", (e) => {
+        if (!drag) { return; }
+        view.x -= (e.clientX - drag[0]) * view.scale;
+        view.y -= (e.clientY - drag[1]) * view.scale;
+        drag = [e.clientX, e.clientY];
+        render();
+    });
+
+    window.addEventListener("resize", () => {
+        viewer.style.height = `${window.innerHeight - viewer.offsetTop}px`;
+        render();
+    });
+
+    render();
+}
+
+
+/**
+ * Position tiles of the best level for the current view, loading only tiles on screen
+ */
+function render()
+{
+    // Highest level needed at the current scale
+    var level = Math.min(dzi.levels - 1, Math.max(0, dzi.levels - 1 - Math.floor(Math.log2(Math.max(view.scale, 1)))));
+    var factor = Math.pow(2, dzi.levels - 1 - level);       // Full resolution pixels per level pixel
+    var size = dzi.tile * factor;                           // Tile size in full resolution pixels
+
+    // Visible tile range
+    var x0 = Math.max(0, Math.floor(view.x / size));
+    var y0 = Math.max(0, Math.floor(view.y / size));
+    var x1 = Math.min(Math.ceil(dzi.width / size) - 1, Math.floor((view.x + viewer.clientWidth * view.scale) / size));
+    var y1 = Math.min(Math.ceil(dzi.height / size) - 1, Math.floor((view.y + viewer.clientHeight * view.scale) / size));
+
+    var visible = {};
+    for (var x = x0; x <= x1; x++) {
+        for (var y = y0; y <= y1; y++) {
+            var id = `${level}/${x}_${y}`;
+            visible[id] = true;
+
+            // Create tile element on first use
+            if (!tiles[id]) {
+                var img = document.createElement("img");
+                img.src = `${dzi.files}/${id}.${dzi.format}`;
+                img.style.position = "absolute";
+                img.draggable = false;
+                viewer.appendChild(img);
+                tiles[id] = img;
+            }
+
+            // Tiles on image edges may be smaller than the tile size
+            var w = Math.min(size, dzi.width - x * size);
+            var h = Math.min(size, dzi.height - y * size);
+
+            var tile = tiles[id];
+            tile.style.left = `${(x * size - view.x) / view.scale}px`;
+            tile.style.top = `${(y * size - view.y) / view.scale}px`;
+            tile.style.width = `${w / view.scale}px`;
+            tile.style.height = `${h / view.scale}px`;
+        }
+    }
+
+    // Remove tiles which are no longer visible
+    for (var id in tiles) {
+        if (!visible[id]) {
+            viewer.removeChild(tiles[id]);
+            delete tiles[id];
+        }
+    }
+}
@@ -0,0 +1,122 @@
+"""
+memdiag.py
+https://github.com/sam210723/xrit-rx
+
+Memory diagnostics using periodic tracemalloc snapshots
+"""
+
+from collections import deque
+import gc
+import os
+from threading import Lock, Thread
+from time import sleep, time
+import tracemalloc
+
+
+class Diagnostics:
+    """
+    Tracks memory held by the demuxer and allocation sites which keep growing
+    """
+
+    def __init__(self, demuxer, interval=60, top=15):
+        """
+        Starts tracing allocations and the snapshot thread
+
+        Arguments:
+            demuxer {Demuxer} -- Demuxer instance to inspect
+            interval {int} -- Seconds between snapshots
+            top {int} -- Number of growing allocation sites to report
+        """
+
+        self.demuxer = demuxer
+        self.interval = interval
+        self.top = top
+        self.lock = Lock()                  # Lock for results
+        self.history = deque(maxlen=1440)   # (time, traced bytes, RSS bytes) per snapshot
+        self.growth = []                    # Allocation sites with most growth since first snapshot
+
+        if not tracemalloc.is_tracing(): tracemalloc.start()
+        self.baseline = tracemalloc.take_snapshot()
+
+        thread = Thread()
+        thread.name = "MEMORY DIAGNOSTICS"
+        thread.daemon = True
+        thread.run = self.loop
+        thread.start()
+
+    def loop(self):
+        """
+        Takes snapshots at a fixed interval
+        """
+
+        while True:
+            sleep(self.interval)
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Records traced memory and compares allocation sites against the baseline snapshot
+        """
+
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ])
+        stats = snap.compare_to(self.baseline, "lineno")
+        growth = [s for s in stats if s.size_diff > 0][:self.top]
+
+        with self.lock:
+            self.history.append((int(time()), tracemalloc.get_traced_memory()[0], rss()))
+            self.growth = [{
+                'site': "{}:{}".format(s.traceback[0].filename, s.traceback[0].lineno),
+                'bytes': s.size,
+                'growth': s.size_diff,
+                'blocks': s.count,
+                'new_blocks': s.count_diff
+            } for s in growth]
+
+    def measure(self):
+        """
+        Returns traced bytes after collecting garbage
+        """
+
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+    def state(self):
+        """
+        Returns memory summary for API
+        """
+
+        d = self.demuxer
+        traced, peak = tracemalloc.get_traced_memory()
+
+        with self.lock:
+            history = list(self.history)
+            growth = list(self.growth)
+
+        return {
+            'traced': traced,
+            'peak': peak,
+            'rss': rss(),
+            'rxq': sum(len(p) for p, t in list(d.rxq)),
+            'channels': { vcid: c.size() for vcid, c in list(d.channels.items()) },
+            'products': { str(p['key']): p['bytes'] for p in d.products.state()['products'] },
+            'history': {
+                'time': [h[0] for h in history],
+                'traced': [h[1] for h in history],
+                'rss': [h[2] for h in history]
+            },
+            'growth': growth
+        }
+
+
+def rss():
+    """
+    Returns resident set size of the process in bytes (None if unavailable)
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
@@ -0,0 +1,214 @@
+"""
+metrics.py
+https://github.com/sam210723/xrit-rx
+
+Pipeline counters and histograms exported in Prometheus text format
+"""
+
+from bisect import bisect_left
+from collections import defaultdict, deque
+import math
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms for the demuxer pipeline
+
+    Counters are plain dict entries so updating them on the hot path costs a single dict increment.
+    """
+
+    # Histogram bucket upper bounds (seconds)
+    buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        """
+        Initialises metrics
+        """
+
+        self.counters = defaultdict(int)    # Counter values by (name, label value)
+        self.histograms = {}                # Histograms by (name, label value)
+        self.gauges = {}                    # Gauge value functions by name
+        self.meta = {}                      # (type, help, label name, buckets) by metric name
+
+    def counter(self, name, help, label=None):
+        """
+        Registers a counter
+
+        Arguments:
+            name {string} -- Metric name
+            help {string} -- Metric description
+            label {string} -- Label name (None for unlabelled counters)
+        """
+
+        self.meta[name] = ("counter", help, label)
+
+    def gauge(self, name, help, func):
+        """
+        Registers a gauge whose value is read when metrics are exported
+
+        Arguments:
+            name {string} -- Metric name
+            help {string} -- Metric description
+            func {function} -- Returns current gauge value
+        """
+
+        self.meta[name] = ("gauge", help, None)
+        self.gauges[name] = func
+
+    def histogram(self, name, help, label=None, buckets=None):
+        """
+        Registers a histogram
+
+        Arguments:
+            name {string} -- Metric name
+            help {string} -- Metric description
+            label {string} -- Label name (None for unlabelled histograms)
+            buckets {tuple} -- Bucket upper bounds (default Metrics.buckets)
+        """
+
+        self.meta[name] = ("histogram", help, label, buckets or self.buckets)
+
+    def inc(self, name, value=None, n=1):
+        """
+        Increments a counter
+
+        Arguments:
+            name {string} -- Metric name
+            value {string} -- Label value
+            n {int} -- Amount to increment by
+        """
+
+        self.counters[(name, value)] += n
+
+    def observe(self, name, sample, value=None):
+        """
+        Adds a sample to a histogram
+
+        Arguments:
+            name {string} -- Metric name
+            sample {float} -- Observed value
+            value {string} -- Label value
+        """
+
+        buckets = self.meta[name][3]
+        h = self.histograms.get((name, value))
+        if h == None:
+            h = self.histograms[(name, value)] = [[0] * (len(buckets) + 1), 0.0]
+
+        h[0][bisect_left(buckets, sample)] += 1
+        h[1] += sample
+
+    def render(self):
+        """
+        Returns all metrics in Prometheus text exposition format
+        """
+
+        counters = list(self.counters.items())
+        histograms = list(self.histograms.items())
+        lines = []
+
+        for name, (mtype, help, label, *buckets) in self.meta.items():
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, mtype))
+
+            if mtype == "counter":
+                for (n, value), count in counters:
+                    if n == name: lines.append("{}{} {}".format(name, labels(label, value), count))
+
+            elif mtype == "gauge":
+                lines.append("{} {}".format(name, self.gauges[name]()))
+
+            elif mtype == "histogram":
+                for (n, value), (counts, total) in histograms:
+                    if n != name: continue
+
+                    # Bucket counts are cumulative
+                    cumulative = 0
+                    for le, count in zip(buckets[0] + ("+Inf",), counts):
+                        cumulative += count
+                        lines.append("{}_bucket{} {}".format(name, labels(label, value, le), cumulative))
+
+                    lines.append("{}_sum{} {}".format(name, labels(label, value), total))
+                    lines.append("{}_count{} {}".format(name, labels(label, value), cumulative))
+
+        return "\n".join(lines) + "\n"
+
+
+class Latency:
+    """
+    Recent latency samples with percentiles, also recorded in a metrics histogram
+    """
+
+    # Histogram bucket upper bounds (seconds)
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(self, metrics, name, help, label, size=1000):
+        """
+        Initialises latency tracker
+
+        Arguments:
+            metrics {Metrics} -- Metrics to record histogram in
+            name {string} -- Histogram metric name
+            help {string} -- Histogram description
+            label {string} -- Label name for keys
+            size {int} -- Number of recent samples kept per key for percentiles
+        """
+
+        self.metrics = metrics
+        self.name = name
+        self.size = size
+        self.samples = {}                   # Recent samples by key
+
+        metrics.histogram(name, help, label, self.buckets)
+
+    def record(self, key, seconds):
+        """
+        Records a latency sample
+
+        Arguments:
+            key {string} -- Stage or product type
+            seconds {float} -- Latency in seconds
+        """
+
+        s = self.samples.get(key)
+        if s == None: s = self.samples[key] = deque(maxlen=self.size)
+
+        s.append(seconds)
+        self.metrics.observe(self.name, seconds, key)
+
+    def percentiles(self):
+        """
+        Returns count, p50, p95, p99 and maximum of recent samples for each key (milliseconds)
+        """
+
+        results = {}
+        for key, s in list(self.samples.items()):
+            s = sorted(s)
+            if not s: continue
+
+            results[key] = { 'count': len(s) }
+            for p in (50, 95, 99):
+                results[key]['p{}'.format(p)] = round(s[max(0, math.ceil(p / 100 * len(s)) - 1)] * 1000, 2)
+            results[key]['max'] = round(s[-1] * 1000, 2)
+
+        return results
+
+
+def labels(label, value, le=None):
+    """
+    Formats Prometheus label set
+
+    Arguments:
+        label {string} -- Label name
+        value {string} -- Label value
+        le {float} -- Histogram bucket upper bound
+
+    Returns:
+        string -- Label set (empty if there are no labels)
+    """
+
+    pairs = []
+    if label != None: pairs.append("{}=\"{}\"".format(label, value))
+    if le != None: pairs.append("le=\"{}\"".format(le))
+
+    return "{{{}}}".format(",".join(pairs)) if pairs else ""
@@ -8,11 +8,25 @@ Parsing and assembly functions for downlinked products
 import collections
 import colorama
 from colorama import Fore, Back, Style
+from concurrent.futures import ThreadPoolExecutor
 import io
+import math
 import numpy as np
+import os
 import pathlib
 from PIL import Image, ImageFile, UnidentifiedImageError
 import subprocess
+from threading import Event, Lock, Thread
+from time import time
+
+import sink
+
+
+tile_pool = None        # Thread pool for writing image tiles
+tile_workers = min(32, (os.cpu_count() or 1) + 4)                           # Tile encoder threads
+dop_headers = (b"GK-2A AMI LRIT DOP(Daily Operation Plan)", b"GK-2A AMI HRIT DOP(Daily Operation Plan)")
+canvas_pool = None      # Preallocated channel canvases (created by product manager)
+libjpeg = os.name == "nt" and os.path.isfile("tools\\libjpeg\\jpeg.exe")   # Bundled libjpeg is available
 
 
 def new(config, name):
@@ -27,7 +41,8 @@ def new(config, name):
                 "ANT": AlphanumericText
             },
             "HRIT": {
-                "FD": MultiSegmentImage
+                "FD": MultiSegmentImage,
+                "ANT": AlphanumericText
             }
         }
     }
@@ -45,6 +60,451 @@ def new(config, name):
     return pclass(config, name)
 
 
+def get_resolutions(config, mode):
+    """
+    Returns the resolution of every channel for a satellite, downlink and observation mode
+
+    Arguments:
+        config {namedtuple} -- Configuration tuple
+        mode {string} -- Observation mode
+
+    Returns:
+        dict -- (width, height) tuples by channel name (empty for unknown modes)
+    """
+
+    res = {
+        "GK-2A": {
+            "LRIT": {
+                "FD": {
+                    "IR105": (2200, 2200)
+                }
+            },
+            "HRIT": {
+                "FD": {
+                    "IR105": (2750, 2750),
+                    "IR123": (2750, 2750),
+                    "SW038": (2750, 2750),
+                    "WV069": (2750, 2750),
+                    "VI006": (11000, 11000)
+                }
+            }
+        }
+    }
+
+    try:
+        return res[config.spacecraft][config.downlink][mode]
+    except KeyError:
+        return {}
+
+
+def start_tile_pool():
+    """
+    Creates tile encoder thread pool (worker threads are started as tiles are queued)
+    """
+
+    global tile_pool
+    if tile_pool != None: return
+
+    tile_pool = ThreadPoolExecutor(max_workers=tile_workers, thread_name_prefix="TILES")
+
+
+def stop_tile_pool():
+    """
+    Stops tile encoder threads once queued tiles have been written
+    """
+
+    global tile_pool
+    if tile_pool == None: return
+
+    tile_pool.shutdown(wait=False)
+    tile_pool = None
+
+
+class CanvasPool:
+    """
+    Zeroed channel canvases allocated ahead of scheduled transmissions
+    """
+
+    def __init__(self):
+        self.canvases = {}              # Lists of free canvases by (shape, dtype)
+        self.lock = Lock()              # Lock for canvas dict
+
+    def warm(self, shapes, dtype):
+        """
+        Allocates and touches canvases so page faults happen before segments arrive
+
+        Arguments:
+            shapes {list} -- List of (height, width) tuples
+            dtype {numpy.dtype} -- Canvas data type
+        """
+
+        for shape in shapes:
+            canvas = np.empty(shape, dtype=dtype)
+            canvas.fill(0)
+
+            with self.lock:
+                self.canvases.setdefault((shape, np.dtype(dtype)), []).append(canvas)
+
+    def get(self, shape, dtype):
+        """
+        Returns a preallocated canvas, or a newly allocated canvas if none are free
+
+        Arguments:
+            shape {tuple} -- (height, width) tuple
+            dtype {numpy.dtype} -- Canvas data type
+
+        Returns:
+            numpy.ndarray -- Zeroed canvas
+        """
+
+        with self.lock:
+            free = self.canvases.get((shape, np.dtype(dtype)))
+            if free: return free.pop()
+
+        return np.zeros(shape, dtype=dtype)
+
+    def release(self):
+        """
+        Frees all unused canvases
+        """
+
+        with self.lock: self.canvases.clear()
+
+    def size(self):
+        """
+        Returns number of bytes held by unused canvases
+        """
+
+        with self.lock:
+            return sum(c.nbytes for l in self.canvases.values() for c in l)
+
+
+class Manager:
+    """
+    Tracks open products, saving them on completion, timeout or when the memory budget is exceeded
+    """
+
+    def __init__(self, timeout, budget, callback, preview=0, events=None):
+        """
+        Initialises product manager
+
+        Arguments:
+            timeout {int} -- Seconds without new data before an incomplete product is saved
+            budget {int} -- Maximum bytes held by open products (0 for no limit)
+            callback {function} -- Called with each product after it saves a file
+            preview {int} -- Segments between progressive previews (0 to disable)
+            events {events.Events} -- Publisher for product progress events
+        """
+
+        self.timeout = timeout                      # Incomplete product timeout (sec)
+        self.budget = budget                        # Memory budget (bytes)
+        self.callback = callback                    # Product saved callback
+        self.products = collections.OrderedDict()   # Open products by key (oldest first)
+        self.lock = Lock()                          # Lock for open product dict
+        self.previews = Previews(preview) if preview else None
+        self.events = events                        # Event publisher
+        self.warm = False                           # Resources allocated for scheduled transmission
+
+        global canvas_pool
+        canvas_pool = CanvasPool()
+
+    def add(self, key, config, xrit):
+        """
+        Adds xRIT file to the open product for a key, creating a new product if required
+
+        Arguments:
+            key {int} -- Product key (VCID)
+            config {namedtuple} -- Channel configuration tuple
+            xrit {CCSDS.xRIT} -- xRIT file to add
+        """
+
+        product = self.products.get(key)
+
+        # Save unfinished product when a newer product starts with the same key
+        if product != None and not product.matches(xrit.FILE_NAME):
+            print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SAVING INCOMPLETE PRODUCT (NEW PRODUCT STARTED)")
+            self.finish(key)
+            product = None
+
+        # Create new product
+        if product == None:
+            product = new(config, xrit.FILE_NAME)
+            product.print_info()
+            with self.lock: self.products[key] = product
+
+        # Add data to product
+        last = product.last
+        product.arrived = xrit.arrived
+        product.add(xrit)
+        product.updated = time()
+
+        # Products may save parts of themselves as soon as they are ready (e.g. single channels)
+        if product.last != last: self.callback(product)
+
+        # Update progressive preview
+        if self.previews != None: self.previews.update(product)
+
+        # Publish product progress
+        if self.events != None: self.events.publish("progress", product.status(), key=key)
+
+        # Save and close complete product
+        if product.complete:
+            self.finish(key)
+        else:
+            self.check_budget()
+
+    def check(self):
+        """
+        Saves products which have timed out or exceed the memory budget
+        """
+
+        now = time()
+        for key, product in list(self.products.items()):
+            if now - product.updated > self.timeout:
+                print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SAVING INCOMPLETE PRODUCT (TIMED OUT)")
+                self.finish(key)
+        
+        self.check_budget()
+
+    def check_budget(self):
+        """
+        Saves oldest products until the memory budget is no longer exceeded
+        """
+
+        if not self.budget: return
+
+        while self.size() > self.budget:
+            # Never evict the product still receiving data, as its next file would start
+            # a new product with the same name which overwrites the partial image
+            keys = list(self.products)
+            if len(keys) < 2: break
+            keys.remove(max(keys, key=lambda k: self.products[k].updated))
+
+            print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SAVING INCOMPLETE PRODUCT (MEMORY BUDGET EXCEEDED)")
+            self.finish(keys[0])
+
+    def finish(self, key):
+        """
+        Saves and closes the open product for a key
+        """
+
+        with self.lock: product = self.products.pop(key, None)
+        if product == None: return
+        if self.previews != None: self.previews.remove(product)
+
+        last = product.last
+        product.save()
+        if product.last != last: self.callback(product)
+
+    def prewarm(self, config, mode="FD"):
+        """
+        Allocates canvases and creates tile encoder pool ahead of a scheduled transmission
+
+        Arguments:
+            config {namedtuple} -- Channel configuration tuple
+            mode {string} -- Observation mode of expected product
+        """
+
+        if self.warm: return
+        self.warm = True
+
+        # HRIT canvases stay 16-bit when full bit depth output is enabled
+        raw = config.downlink == "HRIT" and config.radiometric != "none"
+        dtype = np.uint16 if raw else np.uint8
+        shapes = [(h, w) for w, h in get_resolutions(config, mode).values()]
+
+        # Stay within memory budget
+        needed = sum(h * w * np.dtype(dtype).itemsize for h, w in shapes)
+        if self.budget and self.size() + needed > self.budget:
+            print(Fore.WHITE + Back.RED + Style.BRIGHT + "SKIPPING PRE-WARM (MEMORY BUDGET EXCEEDED)")
+        else:
+            canvas_pool.warm(shapes, dtype)
+
+        # Load image plugins and create tile encoder pool
+        Image.init()
+        if config.tiles: start_tile_pool()
+
+    def release(self):
+        """
+        Frees pre-warmed resources once a scheduled transmission has passed
+        """
+
+        if not self.warm or self.products: return
+        self.warm = False
+
+        canvas_pool.release()
+        stop_tile_pool()
+
+    def flush(self):
+        """
+        Saves and closes all open products
+        """
+
+        for key in list(self.products):
+            self.finish(key)
+
+    def size(self):
+        """
+        Returns total number of bytes held by open products
+        """
+
+        return sum(p.size() for p in list(self.products.values()))
+
+    def state(self):
+        """
+        Returns status of manager and all open products
+        """
+
+        with self.lock: items = list(self.products.items())
+        now = time()
+
+        products = []
+        for key, product in items:
+            status = product.status()
+            status['key'] = key
+            status['age'] = round(now - product.started, 1)
+            status['idle'] = round(now - product.updated, 1)
+            products.append(status)
+
+        return {
+            'products': products,
+            'bytes': sum(p['bytes'] for p in products),
+            'budget': self.budget,
+            'timeout': self.timeout,
+            'pool': canvas_pool.size(),
+            'warm': self.warm
+        }
+
+
+class Previews:
+    """
+    Progressive low resolution previews of incomplete multi-segment images
+    """
+
+    def __init__(self, interval, width=550):
+        """
+        Initialises preview generator and starts encoder thread
+
+        Arguments:
+            interval {int} -- Number of segments between previews of a channel
+            width {int} -- Approximate preview width in pixels
+        """
+
+        self.interval = interval        # Segments between previews
+        self.width = width              # Preview width
+        self.images = {}                # Latest preview JPEG by channel
+        self.status = {}                # Latest preview status by channel
+        self.pending = {}               # Previews waiting to be encoded by channel
+        self.generation = {}            # Removal count by channel (discards previews encoded after removal)
+        self.lock = Lock()              # Lock for pending previews
+        self.ready = Event()            # Pending previews available flag
+
+        # Start preview encoder thread
+        encoder_thread = Thread()
+        encoder_thread.name = "PREVIEW ENCODER"
+        encoder_thread.daemon = True
+        encoder_thread.run = self.encoder
+        encoder_thread.start()
+
+    def update(self, product):
+        """
+        Queues preview of the channel last added to a product every interval segments
+        """
+
+        chan = getattr(product, "lastchan", None)
+        if chan == None: return
+
+        # Drop preview once the full channel image has been saved
+        if chan in product.saved:
+            with self.lock: self.drop(chan)
+            return
+
+        segs = product.segments[chan]
+        if len(segs) % self.interval != 0: return
+
+        # Downsample canvas by striding (copied so the canvas can be released)
+        canvas = product.images[chan]
+        step = max(1, -(-canvas.shape[1] // self.width))
+        arr = product.to_8bit(np.ascontiguousarray(canvas[::step, ::step]))
+
+        status = {
+            'name': product.name.full.replace("<CHANNEL>", chan),
+            'bitmap': "".join("1" if s in segs else "0" for s in range(1, product.total + 1)),
+            'segments': len(segs),
+            'total': product.total,
+            'updated': time()
+        }
+
+        # Replace older pending preview of the same channel
+        with self.lock: self.pending[chan] = (arr, status, self.generation.get(chan, 0))
+        self.ready.set()
+
+    def remove(self, product):
+        """
+        Removes previews belonging to a closed product
+        """
+
+        with self.lock:
+            for chan in getattr(product, "segments", {}):
+                self.drop(chan)
+
+    def drop(self, chan):
+        """
+        Removes preview of a channel, including any being encoded (call with lock held)
+        """
+
+        self.status.pop(chan, None)
+        self.images.pop(chan, None)
+        self.pending.pop(chan, None)
+        self.generation[chan] = self.generation.get(chan, 0) + 1
+
+    def encoder(self):
+        """
+        Encodes pending previews outside the demuxer thread
+        """
+
+        while True:
+            self.ready.wait()
+
+            with self.lock:
+                pending = self.pending
+                self.pending = {}
+                self.ready.clear()
+
+            for chan in pending:
+                arr, status, generation = pending[chan]
+                data = self.encode(arr)
+
+                # Discard preview if its product was closed while encoding
+                with self.lock:
+                    if self.generation.get(chan, 0) != generation: continue
+                    self.images[chan] = data
+                    self.status[chan] = status
+
+    def encode(self, arr):
+        """
+        Encodes preview array as JPEG
+        """
+
+        buf = io.BytesIO()
+        Image.fromarray(arr).save(buf, format='JPEG', quality=80)
+        return buf.getvalue()
+
+    def get(self, chan):
+        """
+        Returns latest preview JPEG for a channel
+        """
+
+        return self.images.get(chan)
+
+    def state(self):
+        """
+        Returns status of latest preview for each channel
+        """
+
+        with self.lock: return dict(self.status)
+
+
 class Product:
     """
     Product base class
@@ -56,7 +516,35 @@ class Product:
         self.alias = "PRODUCT"              # Product type alias
         self.complete = False               # Completed product flag
         self.last = None                    # Path to last file saved
+        self.started = time()               # Time product was created
+        self.updated = time()               # Time data was last added to product
+        self.arrived = None                 # Arrival time of last VCDU added to product (perf_counter)
     
+    def size(self):
+        """
+        Returns number of bytes held by product
+        """
+
+        return len(getattr(self, "payload", None) or b'')
+
+    def status(self):
+        """
+        Returns product status for API
+        """
+
+        return {
+            'name': self.name.full,
+            'type': type(self).__name__,
+            'bytes': self.size()
+        }
+
+    def matches(self, n):
+        """
+        Checks if a file name belongs to this product
+        """
+
+        return self.parse_name(n).full == self.name.full
+
     def parse_name(self, n):
         """
         Parse file name into namedtuple
@@ -150,11 +638,17 @@ class MultiSegmentImage(Product):
         Product.__init__(self, config, name)
         
         # Product specific setup
-        self.counter = 0                    # Segment counter
-        self.images = {}                    # Image list
+        self.total = 10                     # Number of segments per channel
+        self.images = {}                    # Channel canvases (numpy arrays)
+        self.segments = {}                  # Received segment numbers per channel
+        self.saved = []                     # Channels saved to disk
+        self.lastchan = None                # Channel of last segment added
         self.ext = "jpg"                    # Output file extension
         self.lastproglen = 0                # Last number of lines in progress indicator
 
+        # Keep full bit depth in canvases when radiometric output is enabled
+        self.raw = self.config.downlink == "HRIT" and self.config.radiometric != "none"
+
     def add(self, xrit):
         """
         Add data to product
@@ -164,11 +658,11 @@ class MultiSegmentImage(Product):
         chan = xrit.FILE_NAME.split("_")[3]
         num = int(xrit.FILE_NAME.split(".")[0][-2:])
 
-        # Check object for current channel exists
-        try:
-            self.images[chan]
-        except:
-            self.images[chan] = {}
+        # Ignore duplicate segments and segments of already saved channels
+        if chan in self.saved or num in self.segments.get(chan, ()):
+            if self.config.verbose:
+                print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "DUPLICATE SEGMENT ({} #{})".format(chan, num))
+            return
 
         # Get file name
         fname = xrit.FILE_NAME.split(".")[0]
@@ -178,74 +672,239 @@ class MultiSegmentImage(Product):
             buf = io.BytesIO(xrit.DATA_FIELD)
             
             try:
-                img = Image.open(buf)
+                seg = np.asarray(Image.open(buf).convert("L"))
             except UnidentifiedImageError:
                 print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "NO IMAGE FOUND IN XRIT FILE")
                 return
+            except OSError:
+                print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SKIPPING TRUNCATED IMAGE SEGMENT")
+                return
         else:
-            # Get image from J2K payload
-            img = self.convert_to_img(self.get_save_path(filename=False), fname, xrit.DATA_FIELD)
+            # Get full depth segment from J2K payload
+            seg = self.convert_to_array(self.get_save_path(filename=False), fname, xrit.DATA_FIELD)
+
+            # Reduce 10-bit segment to 8-bit unless full depth is being kept
+            if not self.raw: seg = self.to_8bit(seg)
+
+        # Create canvas for current channel
+        if chan not in self.images:
+            self.images[chan] = self.new_canvas(chan, seg)
+            self.segments[chan] = set()
 
-        # Add segment to channel object
-        self.images[chan][num] = img
-        self.counter += 1
+        # Copy segment into channel canvas
+        canvas = self.images[chan]
+        offset = seg.shape[0] * (num - 1)
+        rows = max(0, min(seg.shape[0], canvas.shape[0] - offset))
+        cols = min(seg.shape[1], canvas.shape[1])
+        canvas[offset : offset + rows, :cols] = seg[:rows, :cols]
+
+        self.segments[chan].add(num)
+        self.lastchan = chan
 
         # Update progress bar
         if not self.config.verbose:
             self.progress()
 
-        # Mark product as complete
-        total_segs = { "LRIT": 10, "HRIT": 50 }
-        if self.counter == total_segs[self.config.downlink]: self.complete = True
+        # Save and release channel as soon as all of its segments are present
+        if len(self.segments[chan]) == self.total:
+            self.save_channel(chan)
+
+            # Mark product as complete once every expected channel has been saved
+            if all(c in self.saved for c in self.get_channels(chan)): self.complete = True
+
+    def size(self):
+        """
+        Returns number of bytes held by channel canvases
+        """
+
+        return sum(c.nbytes for c in list(self.images.values()))
+
+    def status(self):
+        """
+        Returns product status including received segments of each channel
+        """
+
+        status = Product.status(self)
+        status['segments'] = { c: sorted(self.segments[c]) for c in list(self.segments) }
+        status['saved'] = list(self.saved)
+        return status
 
     def save(self):
         """
-        Save product to disk
+        Save remaining (incomplete) channels to disk
+        """
+
+        for c in list(self.images):
+            self.save_channel(c)
+
+    def save_channel(self, c):
+        """
+        Save single channel to disk and release its canvas
+
+        Arguments:
+            c {string} -- Channel name
         """
         
         path = self.get_save_path(filename=False)
+        canvas = self.images.pop(c)
+        self.saved.append(c)
 
-        for c in self.images:
-            # Create output image
-            img = Image.new("RGB", self.get_res(c))
-
-            # Combine segments into final image
-            for s in self.images[c]:
-                height = self.images[c][s].size[1]
-                offset = height * (s - 1)
-                
-                try:
-                    img.paste(
-                        self.images[c][s],
-                        ( 0, offset )
-                    )
-                except OSError:
-                    print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SKIPPING TRUNCATED IMAGE SEGMENT")
-            
-            # Get image path for current channel
-            channel_path = "{}{}.{}".format(
-                path,
-                self.name.full.replace("<CHANNEL>", c),
-                self.ext
-            )
+        # Get image path for current channel
+        channel_path = "{}{}.{}".format(
+            path,
+            self.name.full.replace("<CHANNEL>", c),
+            self.ext
+        )
+
+        # Save 8-bit preview image derived from channel canvas
+        img = Image.fromarray(self.to_8bit(canvas))
+        with sink.open_file(channel_path) as f:
+            img.convert("RGB").save(f, format='JPEG', subsampling=0, quality=100)
+        print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(channel_path))
+        self.last = channel_path
+
+        # Write deep zoom tile pyramid from the same image
+        if self.config.tiles:
+            self.save_tiles(img, channel_path[:-len(self.ext) - 1])
 
-            # Save final image
-            img.save(channel_path, format='JPEG', subsampling=0, quality=100)
-            print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(channel_path))
-            self.last = channel_path
+        # Start new progress indicator below save message
+        self.lastproglen = 0
+
+        # Save full depth image from the same canvas
+        if self.raw:
+            self.save_raw(canvas, channel_path[:-len(self.ext) - 1])
     
-    def convert_to_img(self, path, name, data):
+    def save_tiles(self, img, path, size=256):
+        """
+        Writes Deep Zoom (DZI) tile pyramid of a channel image, with tiles encoded in parallel
+
+        Arguments:
+            img {PIL.Image} -- 8-bit channel image
+            path {string} -- Output path without extension
+            size {int} -- Tile size in pixels
+        """
+
+        start_tile_pool()
+
+        width, height = img.size
+        levels = math.ceil(math.log2(max(width, height))) + 1
+        tiles = []
+
+        # Halve image for each level from full resolution down to 1x1
+        for level in reversed(range(levels)):
+            lpath = "{}_files/{}/".format(path, level)
+            pathlib.Path(lpath).mkdir(parents=True, exist_ok=True)
+
+            for x in range(math.ceil(img.size[0] / size)):
+                for y in range(math.ceil(img.size[1] / size)):
+                    box = (x * size, y * size, min((x + 1) * size, img.size[0]), min((y + 1) * size, img.size[1]))
+                    tiles.append((img, box, "{}{}_{}.jpg".format(lpath, x, y)))
+            
+            img = img.resize((max(1, math.ceil(img.size[0] / 2)), max(1, math.ceil(img.size[1] / 2))), Image.BOX)
+
+        # Write DZI descriptor once every tile has been written, so the viewer never loads missing tiles
+        remaining = [len(tiles)]
+        errors = []
+        lock = Lock()
+
+        def tile_done(future):
+            with lock:
+                if future.exception() != None: errors.append(future.exception())
+                remaining[0] -= 1
+                if remaining[0]: return
+
+            if errors:
+                print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "FAILED TO SAVE {} TILES OF \"{}.dzi\": {}".format(len(errors), path, errors[0]))
+                return
+
+            try:
+                with sink.open_file(path + ".dzi", "w") as f:
+                    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+                    f.write('<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="jpg" Overlap="0" TileSize="{}">'.format(size))
+                    f.write('<Size Width="{}" Height="{}"/></Image>\n'.format(width, height))
+            except OSError as e:
+                print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "FAILED TO SAVE \"{}.dzi\": {}".format(path, e))
+
+        for t in tiles:
+            tile_pool.submit(self.save_tile, *t).add_done_callback(tile_done)
+
+        print("    " + Fore.GREEN + Style.BRIGHT + "Saving {} level tile pyramid \"{}.dzi\"".format(levels, path))
+
+    def save_tile(self, img, box, path):
+        """
+        Crops and saves single tile (runs in tile thread pool)
+        """
+
+        with sink.open_file(path) as f:
+            img.crop(box).save(f, format='JPEG', quality=90)
+
+    def save_raw(self, canvas, path):
+        """
+        Saves full depth channel canvas in radiometric output format
+
+        Arguments:
+            canvas {numpy.ndarray} -- 16-bit channel canvas
+            path {string} -- Output path without extension
         """
-        Converts J2K to Pillow Image object via PPM using libjpeg
+
+        fmt = self.config.radiometric
+
+        if fmt == "npy":
+            path += ".npy"
+            with sink.open_file(path) as f:
+                np.save(f, canvas)
+        else:
+            path += ".png" if fmt == "png" else ".tif"
+            with sink.open_file(path) as f:
+                Image.fromarray(canvas).save(f, format="PNG" if fmt == "png" else "TIFF")
+        
+        print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(path))
+
+    def new_canvas(self, channel, seg):
+        """
+        Creates blank canvas for a channel based on its resolution
+
+        Arguments:
+            channel {string} -- Channel name
+            seg {numpy.ndarray} -- First segment received for channel
+
+        Returns:
+            numpy.ndarray -- Zeroed channel canvas
+        """
+
+        width, height = self.get_res(channel)
+
+        # Fall back to segment dimensions for unknown channels
+        if width == None:
+            height, width = seg.shape[0] * 10, seg.shape[1]
+
+        if canvas_pool == None: return np.zeros((height, width), dtype=seg.dtype)
+        return canvas_pool.get((height, width), seg.dtype)
+
+    def to_8bit(self, arr):
+        """
+        Converts 10-bit array to 8-bit using integer shift (8-bit arrays are returned unchanged)
+        """
+
+        if arr.dtype == np.uint8: return arr
+        return (arr >> 2).astype(np.uint8)
+
+    def convert_to_array(self, path, name, data):
+        """
+        Converts J2K to numpy array via PPM using libjpeg (or Pillow where libjpeg is not available)
 
         Arguments:
             path {string} -- Path for temporary files
             data {bytes} -- JPEG2000 image
 
         Returns:
-            Pillow.Image -- Pillow Image object
+            numpy.ndarray -- 16-bit image array
         """
 
+        if not libjpeg:
+            img = Image.open(io.BytesIO(data))
+            return np.asarray(img).astype(np.uint16)
+
         # Save JP2 to disk
         jp2Name = path + name + ".jp2"
         f = open(jp2Name, "wb")
@@ -257,42 +916,37 @@ class MultiSegmentImage(Product):
         subprocess.call(["tools\\libjpeg\\jpeg", jp2Name, ppmName], stdout=subprocess.DEVNULL)
         pathlib.Path(jp2Name).unlink()
         
-        # Load and convert 16-bit PPM to 8-bit image
+        # Load 16-bit PPM into array
         img = Image.open(ppmName)
-        iarr = np.uint8(np.array(img) / 4)
-        img = Image.fromarray(iarr)
+        iarr = np.asarray(img).astype(np.uint16)
+        img.close()
         pathlib.Path(ppmName).unlink()
-        return img
+        return iarr
     
+    def get_channels(self, channel):
+        """
+        Returns list of channels expected in the product (falls back to the given channel for unknown products)
+        """
+
+        return list(self.get_resolutions()) or [channel]
+
     def get_res(self, channel):
         """
         Returns the horizontal and vertical resolution of the given satellte, downlink, observation mode and channel
         """
 
-        res = {
-            "GK-2A": {
-                "LRIT": {
-                    "FD": {
-                        "IR105": (2200, 2200)
-                    }
-                },
-                "HRIT": {
-                    "FD": {
-                        "IR105": (2750, 2750),
-                        "IR123": (2750, 2750),
-                        "SW038": (2750, 2750),
-                        "WV069": (2750, 2750),
-                        "VI006": (11000, 11000)
-                    }
-                }
-            }
-        }
-
         try:
-            return res[self.config.spacecraft][self.config.downlink][self.name.mode][channel]
-        except:
+            return self.get_resolutions()[channel]
+        except KeyError:
             return (None, None)
 
+    def get_resolutions(self):
+        """
+        Returns the resolution of every channel for the given satellite, downlink and observation mode
+        """
+
+        return get_resolutions(self.config, self.name.mode)
+
     def progress(self):
         """
         Renders progress bar for multi-segment mult-wavelength images
@@ -307,20 +961,20 @@ class MultiSegmentImage(Product):
         self.lastproglen = 0
 
         # Loop through channels
-        for c in self.images:
+        for c in self.segments:
             line += "    {}  {}{}{}{}{}{}{}{}{}{}  {}/{}\n".format(
                 c,
-                "\u2588\u2588" if 1 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 2 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 3 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 4 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 5 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 6 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 7 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 8 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 9 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 10 in self.images[c].keys() else "\u2591\u2591",
-                len(self.images[c]),
+                "\u2588\u2588" if 1 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 2 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 3 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 4 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 5 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 6 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 7 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 8 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 9 in self.segments[c] else "\u2591\u2591",
+                "\u2588\u2588" if 10 in self.segments[c] else "\u2591\u2591",
+                len(self.segments[c]),
                 10
             )
             self.lastproglen += 1
@@ -356,7 +1010,7 @@ class SingleSegmentImage(Product):
         self.ext = self.get_ext()
         path = self.get_save_path(self.ext)
 
-        outf = open(path, mode="wb")
+        outf = sink.open_file(path)
         outf.write(self.payload)
         outf.close()
 
@@ -389,6 +1043,7 @@ class AlphanumericText(Product):
         # Product specific setup
         self.payload = None
         self.ext = "txt"
+        self.dop = False
 
     def add(self, xrit):
         """
@@ -405,13 +1060,14 @@ class AlphanumericText(Product):
 
         path = self.get_save_path(self.ext)
         
-        outf = open(path, mode="wb")
+        outf = sink.open_file(path)
         outf.write(self.payload)
         outf.close()
 
-        # Detect GK-2A LRIT DOP
-        if self.payload[:40].decode('utf-8') == "GK-2A AMI LRIT DOP(Daily Operation Plan)":
-            print("    GK-2A LRIT Daily Operation Plan")
+        # Detect GK-2A LRIT/HRIT DOP
+        if self.payload.startswith(dop_headers):
+            print("    GK-2A {} Daily Operation Plan".format(self.config.downlink))
+            self.dop = True
 
         print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(path))
         self.last = path
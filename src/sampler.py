@@ -0,0 +1,144 @@
+"""
+sampler.py
+https://github.com/sam210723/xrit-rx
+
+Statistical profiler which samples the stacks of every running thread
+"""
+
+from collections import Counter, OrderedDict
+import hashlib
+import os
+import sys
+import threading
+from time import perf_counter, sleep
+from xml.sax.saxutils import escape
+
+lock = threading.Lock()     # Only one capture may run at a time
+
+
+def capture(seconds, interval=0.005):
+    """
+    Samples stacks of all other threads for a period of time
+
+    Arguments:
+        seconds {float} -- Capture duration
+        interval {float} -- Time between samples
+
+    Returns:
+        collections.Counter -- Sample counts by stack (tuple of thread name then frames, outermost first)
+    """
+
+    stacks = Counter()
+    me = threading.get_ident()
+    end = perf_counter() + seconds
+
+    while perf_counter() < end:
+        names = { t.ident: t.name for t in threading.enumerate() }
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me: continue
+
+            stack = []
+            while frame != None:
+                code = frame.f_code
+                stack.append("{} ({})".format(code.co_name, os.path.basename(code.co_filename)))
+                frame = frame.f_back
+
+            stack.append(names.get(ident, "THREAD {}".format(ident)))
+            stacks[tuple(reversed(stack))] += 1
+
+        sleep(interval)
+
+    return stacks
+
+
+def collapsed(stacks):
+    """
+    Formats stacks as collapsed stack lines (compatible with flamegraph.pl and speedscope)
+    """
+
+    lines = ["{} {}".format(";".join(s), n) for s, n in stacks.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+def top(stacks):
+    """
+    Formats table of functions by samples spent in the function itself and in total
+    """
+
+    total = sum(stacks.values()) or 1
+    own = Counter()
+    cumulative = Counter()
+
+    for s, n in stacks.items():
+        own[(s[0], s[-1])] += n
+        for frame in set(s[1:]): cumulative[(s[0], frame)] += n
+
+    lines = ["{:>8} {:>7} {:>8} {:>7}  {:<24} {}".format("OWN", "OWN%", "TOTAL", "TOTAL%", "THREAD", "FUNCTION")]
+    for (thread, frame), n in cumulative.most_common():
+        o = own[(thread, frame)]
+        lines.append("{:>8} {:>6.1f}% {:>8} {:>6.1f}%  {:<24} {}".format(o, o / total * 100, n, n / total * 100, thread, frame))
+
+    return "\n".join(lines) + "\n"
+
+
+def flamegraph(stacks, width=1200, row=17):
+    """
+    Renders stacks as an SVG flame graph
+
+    Arguments:
+        stacks {collections.Counter} -- Sample counts by stack
+        width {int} -- Image width in pixels
+        row {int} -- Height of each stack frame in pixels
+
+    Returns:
+        string -- SVG document
+    """
+
+    # Build call tree
+    root = { 'count': 0, 'children': OrderedDict() }
+    depth = 0
+    for s, n in sorted(stacks.items()):
+        node = root
+        node['count'] += n
+        for frame in s:
+            node = node['children'].setdefault(frame, { 'count': 0, 'children': OrderedDict() })
+            node['count'] += n
+        depth = max(depth, len(s))
+
+    total = root['count'] or 1
+    height = (depth + 1) * row
+    rects = []
+
+    def draw(name, node, x, level):
+        w = node['count'] / total * width
+        if w < 0.5: return
+
+        y = height - (level + 1) * row
+        colour = int(hashlib.md5(name.encode('utf-8')).hexdigest()[:4], 16)
+        fill = "rgb({},{},{})".format(205 + colour % 50, 80 + colour % 150, 40 + colour % 50)
+        label = name if len(name) * 7 < w else name[:int(w / 7) - 2] + ".." if w > 28 else ""
+
+        rects.append(
+            "<g><title>{0} ({1} samples, {2:.1f}%)</title>"
+            "<rect x=\"{3:.1f}\" y=\"{4}\" width=\"{5:.1f}\" height=\"{6}\" fill=\"{7}\" rx=\"2\"/>"
+            "<text x=\"{8:.1f}\" y=\"{9}\">{10}</text></g>".format(
+                escape(name), node['count'], node['count'] / total * 100,
+                x, y, w - 0.5, row - 1, fill,
+                x + 3, y + row - 5, escape(label)
+            )
+        )
+
+        for child, c in node['children'].items():
+            draw(child, c, x, level + 1)
+            x += c['count'] / total * width
+
+    x = 0
+    for name, node in root['children'].items():
+        draw(name, node, x, 0)
+        x += node['count'] / total * width
+
+    return (
+        "<svg xmlns=\"http://www.w3.org/2000/svg\" width=\"{0}\" height=\"{1}\" viewBox=\"0 0 {0} {1}\" "
+        "font-family=\"monospace\" font-size=\"11\">{2}</svg>\n"
+    ).format(width, height, "".join(rects))
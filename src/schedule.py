@@ -0,0 +1,183 @@
+"""
+schedule.py
+https://github.com/sam210723/xrit-rx
+
+Parses received GK-2A LRIT/HRIT Daily Operation Plans into a transmission schedule
+"""
+
+from colorama import Fore, Back, Style
+import json
+import os
+from threading import Lock
+from time import time
+
+import sink
+
+
+class Schedule:
+    """
+    Transmission schedule from the most recently received Daily Operation Plan (DOP)
+    """
+
+    def __init__(self, path):
+        """
+        Initialises schedule and loads cached schedule from disk
+
+        Arguments:
+            path {string} -- Path of schedule cache file
+        """
+
+        self.path = path                # Schedule cache file path
+        self.date = None                # Date of DOP (YYYYMMDD)
+        self.received = None            # Time DOP was received (UNIX timestamp)
+        self.entries = []               # List of schedule entries
+        self.lock = Lock()              # Lock for schedule state
+
+        self.load()
+
+    def update(self, date, text):
+        """
+        Replaces schedule with entries parsed from a received DOP
+
+        Arguments:
+            date {string} -- Date of DOP (YYYYMMDD)
+            text {bytes} -- DOP text
+
+        Returns:
+            bool -- Schedule was updated
+        """
+
+        entries = parse(text)
+        if not entries: return False
+
+        with self.lock:
+            # Ignore DOPs older than the current schedule
+            if self.date != None and date < self.date: return False
+
+            self.date = date
+            self.received = time()
+            self.entries = entries
+
+        self.save()
+        return True
+
+    def upcoming(self, types, lead):
+        """
+        Finds a schedule entry which is in progress or starts soon
+
+        Arguments:
+            types {list} -- Entry types to match (e.g. ["FD"])
+            lead {int} -- Seconds before start time to match entries
+
+        Returns:
+            dict -- Matching schedule entry (None if no match)
+        """
+
+        now = time() % 86400
+        with self.lock: entries = list(self.entries)
+
+        for entry in entries:
+            if entry['type'] not in types: continue
+
+            start = seconds(entry['start'])
+            end = seconds(entry['end'])
+            if end < start: end += 86400
+
+            # Check adjacent days for entries near midnight
+            for t in (now - 86400, now, now + 86400):
+                if start - lead <= t <= end: return entry
+
+        return None
+
+    def load(self):
+        """
+        Loads cached schedule from disk
+        """
+
+        if not os.path.isfile(self.path): return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+
+            self.date = data['date']
+            self.received = data['received']
+            self.entries = data['entries']
+        except (OSError, ValueError, KeyError):
+            print(Fore.WHITE + Back.RED + Style.BRIGHT + "SCHEDULE CACHE \"{}\" IS INVALID".format(self.path))
+
+    def save(self):
+        """
+        Writes schedule to cache file
+        """
+
+        tmp = self.path + ".tmp"
+        try:
+            with sink.open_file(tmp, "w") as f:
+                json.dump(self.state(), f)
+            if not sink.null: os.replace(tmp, self.path)
+        except OSError as e:
+            print(Fore.WHITE + Back.RED + Style.BRIGHT + "FAILED TO SAVE SCHEDULE CACHE: {}".format(e))
+
+    def state(self):
+        """
+        Returns schedule as a JSON serialisable dict
+        """
+
+        with self.lock:
+            return {
+                'date': self.date,
+                'received': self.received,
+                'entries': self.entries
+            }
+
+
+def parse(text):
+    """
+    Parses schedule entries from DOP text
+
+    Arguments:
+        text {bytes} -- DOP text
+
+    Returns:
+        list -- List of schedule entry dicts (empty if no schedule found)
+    """
+
+    lines = [l.strip() for l in text.decode('utf-8', errors='replace').splitlines()]
+
+    # Find start and end of schedule table
+    start = end = None
+    for i, line in enumerate(lines):
+        if line.startswith("TIME(UTC)"):
+            start = i + 1
+        if line.startswith("ABBREVIATIONS:"):
+            end = i - 2
+
+    if start == None or end == None: return []
+
+    entries = []
+    for line in lines[start:end + 1]:
+        fields = line.split("\t")
+        if len(fields) < 4 or "-" not in fields[0]: continue
+
+        s, e = fields[0].split("-", 1)
+        entry = {
+            'start': s,
+            'end': e,
+            'type': fields[1][:-3],
+            'id': fields[1][-3:],
+            'output': fields[3] == "O"
+        }
+
+        if entry['type'] == "EGMSG": continue   # Skip EGMSG
+        entries.append(entry)
+
+    return entries
+
+
+def seconds(hhmmss):
+    """
+    Converts HHMMSS time string to seconds since midnight
+    """
+
+    return int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6])
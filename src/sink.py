@@ -0,0 +1,63 @@
+"""
+sink.py
+https://github.com/sam210723/xrit-rx
+
+Opens output files, or in-memory null sinks which count and discard output (--bench mode)
+"""
+
+import io
+from threading import Lock
+
+null = False            # Discard output instead of writing to disk
+files = 0               # Number of files discarded
+written = 0             # Bytes discarded
+lock = Lock()           # Lock for discarded file stats
+
+
+def open_file(path, mode="wb"):
+    """
+    Opens output file for writing
+
+    Arguments:
+        path {string} -- Output file path
+        mode {string} -- File mode ("wb" or "w")
+
+    Returns:
+        file -- File object, or null sink if output is being discarded
+    """
+
+    if not null: return open(path, mode)
+    return NullFile() if "b" in mode else NullText()
+
+
+def count(n):
+    """
+    Adds discarded file to stats
+    """
+
+    global files
+    global written
+
+    with lock:
+        files += 1
+        written += n
+
+
+class NullFile(io.BytesIO):
+    """
+    Binary file held in memory until closed then discarded
+    """
+
+    def close(self):
+        if not self.closed: count(self.seek(0, io.SEEK_END))
+        io.BytesIO.close(self)
+
+
+class NullText(io.StringIO):
+    """
+    Text file held in memory until closed then discarded
+    """
+
+    def close(self):
+        if not self.closed: count(self.seek(0, io.SEEK_END))
+        io.StringIO.close(self)
@@ -0,0 +1,103 @@
+"""
+timers.py
+https://github.com/sam210723/xrit-rx
+
+Per-stage timing of pipeline steps for --profile mode
+"""
+
+from colorama import Fore, Back, Style
+from functools import wraps
+from threading import Lock, local
+from time import perf_counter
+
+import ccsds as CCSDS
+import products
+
+stats = {}              # [calls, total, max] by stage name
+lock = Lock()           # Lock for stage stats
+nested = local()        # Time spent in nested timed stages by thread
+
+# Pipeline steps to time (stage name, class, method)
+# Timers are only installed in --profile mode, so the pipeline has no timing overhead otherwise
+# Time spent in a nested stage (e.g. saving a channel once its last segment is added) only counts towards that stage
+stages = [
+    ("VCDU parse",          CCSDS.VCDU,                     "__init__"),
+    ("M_PDU parse",         CCSDS.M_PDU,                    "__init__"),
+    ("CP_PDU append",       CCSDS.CP_PDU,                   "append"),
+    ("CP_PDU finish/CRC",   CCSDS.CP_PDU,                   "finish"),
+    ("TP_File append",      CCSDS.TP_File,                  "append"),
+    ("TP_File finish",      CCSDS.TP_File,                  "finish"),
+    ("S_PDU decrypt",       CCSDS.S_PDU,                    "__init__"),
+    ("xRIT parse",          CCSDS.xRIT,                     "__init__"),
+    ("xRIT save",           CCSDS.xRIT,                     "save"),
+    ("Product add",         products.MultiSegmentImage,     "add"),
+    ("Product add",         products.SingleSegmentImage,    "add"),
+    ("Product add",         products.AlphanumericText,      "add"),
+    ("Product save",        products.MultiSegmentImage,     "save_channel"),
+    ("Product save",        products.SingleSegmentImage,    "save"),
+    ("Product save",        products.AlphanumericText,      "save")
+]
+
+
+def install():
+    """
+    Wraps each pipeline step with a timer
+    """
+
+    for name, cls, method in stages:
+        setattr(cls, method, timed(name, getattr(cls, method)))
+
+
+def timed(name, func):
+    """
+    Returns function wrapped with a timer for a stage, excluding time spent in nested stages
+
+    Arguments:
+        name {string} -- Stage name
+        func {function} -- Function to time
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(nested, "t", 0)
+        nested.t = 0
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            t = perf_counter() - start
+            add(name, t - nested.t)
+            nested.t = outer + t
+
+    return wrapper
+
+
+def add(name, t):
+    """
+    Adds timing sample to stage stats
+    """
+
+    with lock:
+        s = stats.get(name)
+        if s == None:
+            stats[name] = [1, t, t]
+        else:
+            s[0] += 1
+            s[1] += t
+            if t > s[2]: s[2] = t
+
+
+def report():
+    """
+    Prints per-stage timing breakdown
+    """
+
+    with lock: rows = [(name, list(s)) for name, s in stats.items()]
+
+    print("\n" + Fore.GREEN + Style.BRIGHT + "PROFILE")
+    print("{:<20}{:>10}{:>12}{:>12}{:>12}".format("STAGE", "CALLS", "TOTAL (s)", "MEAN (ms)", "MAX (ms)"))
+    for name, (calls, total, peak) in sorted(rows, key=lambda r: r[1][1], reverse=True):
+        print("{:<20}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}".format(name, calls, total, total / calls * 1000, peak * 1000))
+
+    if not rows: print("No pipeline steps have run")
+    print()
@@ -0,0 +1,473 @@
+"""
+benchmark.py
+https://github.com/sam210723/xrit-rx
+
+Measures throughput and peak memory of each decoding pipeline stage.
+Results are saved as JSON and can be compared against a previous run to find regressions.
+"""
+
+import argparse
+from collections import namedtuple
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter, strftime
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+import PIL
+
+# Import pipeline from parent directory
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import ccsds as CCSDS
+from demuxer import Demuxer, Channel
+import products
+import sink
+import timers
+
+from generator import Stream, build_xrit, earth
+
+sample = os.path.join(root, "..", "samples", "GK-2A LRIT VCDU TEST.bin")
+
+argparser = argparse.ArgumentParser(description="Measures throughput and peak memory of each decoding pipeline stage.")
+argparser.add_argument("--file", action="store", help="LRIT VCDU file to replay (default \"samples/GK-2A LRIT VCDU TEST.bin\")", default=sample)
+argparser.add_argument("-o", "--output", action="store", help="Path of results JSON (default \"benchmark.json\")", default="benchmark.json")
+argparser.add_argument("--baseline", action="store", help="Results JSON to compare against", default=None)
+argparser.add_argument("--threshold", action="store", help="Slowdown in percent reported as a regression (default 10)", type=float, default=10)
+argparser.add_argument("--repeat", action="store", help="Runs of each stage, fastest is kept (default 3)", type=int, default=3)
+argparser.add_argument("--seed", action="store", help="Seed for synthetic image data (default 0)", type=int, default=0)
+argparser.add_argument("--quick", action="store_true", help="Skip the 11000x11000 VI006 channel in HRIT stages")
+args = argparser.parse_args()
+
+# Globals
+packets = []            # VCDUs from sample file
+lpackets = []           # VCDUs of synthetic LRIT stream
+hpackets = []           # VCDUs of synthetic HRIT stream
+cppdus = []             # Finished CP_PDUs captured from sample
+tpfiles = []            # TP_File payloads (S_PDUs) captured from sample
+keys = {}               # Generated keys for each key index in sample
+lrit = []               # Synthetic LRIT xRIT files (JPEG segments)
+hrit = []               # Synthetic HRIT xRIT files (J2K segments)
+segments = {}           # J2K segment of each HRIT channel
+results = {}            # Results by stage name
+
+config = namedtuple('demux_config', 'spacecraft downlink verbose dump output images xrit blacklist keys radiometric timeout memory preview tiles prewarm memdiag')
+
+
+def init():
+    # Discard output files so disk speed is not measured
+    sink.null = True
+
+    print("Preparing benchmark data...")
+    load_sample()
+    make_lrit()
+    make_hrit()
+    print("  {} VCDUs, {} CP_PDUs, {} TP_Files".format(len(packets), len(cppdus), len(tpfiles)))
+    print("  {} LRIT segments ({} VCDUs), {} HRIT segments ({} VCDUs)\n".format(len(lrit), len(lpackets), len(hrit), len(hpackets)))
+
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-benchmark-")
+    try:
+        run_stages(tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    out = {
+        'time': strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'quick': args.quick,
+        'peak_rss': peak_rss(),
+        'stages': results
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(out, f, indent=2)
+    print("\nSaved results to \"{}\"".format(args.output))
+
+    if args.baseline:
+        if compare(args.baseline): exit(1)
+
+
+def run_stages(tmp):
+    """
+    Runs every benchmark stage
+
+    Arguments:
+        tmp {string} -- Temporary output directory
+    """
+
+    lut = CCSDS.CP_PDU.CCITT_LUT(None)
+    payload = lambda l: sum(len(x) for x in l)
+
+    print("{:<18}{:>10}{:>14}{:>10}{:>12}{:>12}".format("STAGE", "ITEMS", "ITEMS/s", "MB/s", "TIME (s)", "PEAK (MB)"))
+
+    # CCSDS layers
+    stage("vcdu_parse", "VCDU", len(packets), len(packets) * 892,
+          lambda: [CCSDS.VCDU(p) for p in packets])
+    vcdus = [CCSDS.VCDU(p) for p in packets]
+    stage("mpdu_parse", "M_PDU", len(vcdus), len(vcdus) * 886,
+          lambda: [CCSDS.M_PDU(v.MPDU) for v in vcdus])
+    stage("cppdu_crc", "CP_PDU", len(cppdus), sum(len(c.PAYLOAD) for c in cppdus),
+          lambda: [c.CRC(lut) for c in cppdus])
+    stage("reassembly", "VCDU", len(packets), len(packets) * 892,
+          lambda: replay(tmp, "LRIT", images=False))
+    stage("decryption", "S_PDU", len(tpfiles), payload(tpfiles),
+          lambda: [CCSDS.S_PDU(d, keys) for d in tpfiles])
+
+    # Image decoding
+    data = [x[1] for x in lrit]
+    stage("jpeg_decode", "segment", len(data), payload(data),
+          lambda: [np.asarray(Image.open(io.BytesIO(d)).convert("L")) for d in data])
+    data = list(segments.values())
+    product = products.MultiSegmentImage(demux_config(tmp, "HRIT"), hrit[0][0])
+    stage("j2k_decode", "segment", len(data), payload(data),
+          lambda: [product.convert_to_array(tmp, "benchmark", d) for d in data])
+
+    # Products (decoding, canvas assembly and encoding)
+    stage("lrit_product", "segment", len(lrit), payload([x[1] for x in lrit]),
+          lambda: assemble(tmp, "LRIT", lrit))
+    split_product(tmp, hrit)
+
+    # Complete pipeline (generated streams, as sample keys are not available to decrypt its images)
+    stage("lrit_end_to_end", "VCDU", len(lpackets), len(lpackets) * 892,
+          lambda: replay(tmp, "LRIT", images=True, data=lpackets))
+    stage("hrit_end_to_end", "VCDU", len(hpackets), len(hpackets) * 892,
+          lambda: replay(tmp, "HRIT", images=True, data=hpackets))
+
+
+def stage(name, unit, items, size, func, runs=None):
+    """
+    Times a stage and measures its peak memory
+
+    Arguments:
+        name {string} -- Stage name
+        unit {string} -- Name of items processed by stage
+        items {int} -- Items processed per run
+        size {int} -- Bytes processed per run
+        func {function} -- Runs stage once (None for stages derived from other timings)
+        runs {list} -- Run times to use instead of timing func
+    """
+
+    if runs == None: runs = [timed(func) for i in range(args.repeat)]
+    seconds = min(runs)
+
+    # Measure memory separately so tracing does not affect timing
+    peak = None
+    if func != None:
+        gc.collect()
+        tracemalloc.start()
+        with quiet(): func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    results[name] = {
+        'unit': unit,
+        'items': items,
+        'bytes': size,
+        'seconds': seconds,
+        'runs': runs,
+        'rate': items / seconds if seconds else 0,
+        'mbps': size / seconds / 1e6 if seconds else 0,
+        'peak': peak
+    }
+
+    print("{:<18}{:>10}{:>14.1f}{:>10.2f}{:>12.3f}{:>12}".format(
+        name,
+        items,
+        results[name]['rate'],
+        results[name]['mbps'],
+        seconds,
+        "-" if peak == None else "{:.1f}".format(peak / 1e6)
+    ))
+
+
+def timed(func):
+    """
+    Returns time taken by one run of a stage
+    """
+
+    gc.collect()
+    with quiet():
+        start = perf_counter()
+        func()
+        return perf_counter() - start
+
+
+def split_product(tmp, data):
+    """
+    Times HRIT product assembly, then splits it into J2K decoding, canvas assembly and channel encoding
+
+    Arguments:
+        tmp {string} -- Temporary output directory
+        data {list} -- (name, payload, xRIT file) tuples
+    """
+
+    size = sum(len(x[1]) for x in data)
+    res = products.get_resolutions(demux_config("", "HRIT"), "FD")
+    chans = set(x[0].split("_")[3] for x in data)
+    pixels = sum(res[c][0] * res[c][1] for c in chans)
+
+    # Time decoding and encoding inside product with pipeline stage timers
+    original = {}
+    for method in ("convert_to_array", "save_channel"):
+        original[method] = getattr(products.MultiSegmentImage, method)
+        setattr(products.MultiSegmentImage, method, timers.timed(method, original[method]))
+
+    func = lambda: assemble(tmp, "HRIT", data)
+    runs = []
+    try:
+        for i in range(args.repeat):
+            timers.stats.clear()
+            t = timed(func)
+            runs.append((t, timers.stats["convert_to_array"][1], timers.stats["save_channel"][1]))
+
+        stage("hrit_product", "segment", len(data), size, func, [r[0] for r in runs])
+    finally:
+        for method, f in original.items():
+            setattr(products.MultiSegmentImage, method, f)
+
+    # Canvas assembly is the part of the fastest run not spent decoding or encoding
+    total, decode, encode = min(runs)
+    stage("canvas_assembly", "segment", len(data), size, None, [total - decode - encode])
+    stage("canvas_encode", "channel", len(chans), pixels, None, [encode])
+
+
+def assemble(tmp, downlink, data):
+    """
+    Adds xRIT files to a product through the product manager
+
+    Arguments:
+        tmp {string} -- Output directory
+        downlink {string} -- LRIT or HRIT
+        data {list} -- (name, payload, xRIT file) tuples
+    """
+
+    cfg = demux_config(tmp, downlink)
+    manager = products.Manager(300, 0, lambda p: None)
+    for name, payload, x in data:
+        manager.add(0, cfg, CCSDS.xRIT(x))
+    manager.flush()
+
+
+def replay(tmp, downlink, images, data=None):
+    """
+    Replays VCDUs through a demuxer and waits for them to be processed
+
+    Arguments:
+        tmp {string} -- Output directory
+        downlink {string} -- LRIT or HRIT
+        images {bool} -- Assemble products from xRIT files
+        data {list} -- VCDUs to replay (default sample VCDUs)
+    """
+
+    demux = Demuxer(demux_config(tmp, downlink, images))
+    demux.coreWait = 1
+
+    for p in (packets if data == None else data): demux.push(p)
+    while not demux.complete():
+        demux.coreThread.join(0.001)
+
+    demux.stop()
+    demux.coreThread.join()
+
+    # End-to-end timings only include decoding and encoding if products were saved
+    if images and demux.lastImage == None:
+        raise RuntimeError("No products were saved while replaying {} VCDUs".format(downlink))
+
+
+def demux_config(output, downlink, images=True):
+    """
+    Returns demuxer configuration tuple
+    """
+
+    return config(
+        "GK-2A", downlink, False, None, output + "/", images, False, [], {},
+        "none", 300, 0, 0, False, 0, 0
+    )
+
+
+def load_sample():
+    """
+    Reads sample VCDUs and captures CP_PDUs and S_PDUs produced by the demuxer
+    """
+
+    global keys
+
+    with open(args.file, "rb") as f:
+        data = f.read()
+    packets.extend(data[i : i + 892] for i in range(0, len(data) - 891, 892))
+
+    # Capture finished CP_PDUs and TP_File payloads during one replay
+    handle_CPPDU = Channel.handle_CPPDU
+    handle_xRIT = Channel.handle_xRIT
+    Channel.handle_CPPDU = lambda self, c: (cppdus.append(c), handle_CPPDU(self, c))[1]
+    Channel.handle_xRIT = lambda self, s: (tpfiles.append(s.data), handle_xRIT(self, s))[1]
+
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-benchmark-")
+    try:
+        with quiet(): replay(tmp, "LRIT", images=False)
+    finally:
+        Channel.handle_CPPDU = handle_CPPDU
+        Channel.handle_xRIT = handle_xRIT
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Generate a fixed key for each encryption key index in sample
+    for d in tpfiles:
+        with quiet(): spdu = CCSDS.S_PDU(d, { None: None })
+        if spdu.index != b'\x00\x00':
+            keys[spdu.index] = bytes(range(1, 9))
+
+
+def make_lrit():
+    """
+    Generates a synthetic LRIT full disk (10 JPEG segments)
+    """
+
+    rng = np.random.RandomState(args.seed)
+    disk = earth(2200, 8, rng)
+
+    for num in range(1, 11):
+        buf = io.BytesIO()
+        Image.fromarray(disk[(num - 1) * 220 : num * 220]).save(buf, format="JPEG", quality=85)
+        name = "IMG_FD_001_IR105_20200101_000006_{:02d}.lrit".format(num)
+        lrit.append((name, buf.getvalue(), build_xrit(name, buf.getvalue())))
+
+    lpackets.extend(frame(lrit))
+
+
+def make_hrit():
+    """
+    Generates a synthetic HRIT full disk (10 lossless J2K segments per channel)
+    Every segment of a channel reuses the same middle segment so decoding cost is representative
+    """
+
+    rng = np.random.RandomState(args.seed)
+    chans = [c for c in products.get_resolutions(demux_config("", "HRIT"), "FD").items()]
+    if args.quick: chans = [c for c in chans if c[0] != "VI006"]
+
+    for chan, (w, h) in chans:
+        seg = earth(w, 10, rng, rows=(h // 10 * 5, h // 10 * 6))
+        buf = io.BytesIO()
+        Image.fromarray(seg).save(buf, format="JPEG2000", irreversible=False)
+        segments[chan] = buf.getvalue()
+
+        for num in range(1, 11):
+            name = "IMG_FD_001_{}_20200101_000006_{:02d}.hrit".format(chan, num)
+            hrit.append((name, segments[chan], build_xrit(name, segments[chan])))
+
+    hpackets.extend(frame(hrit))
+
+
+def frame(files):
+    """
+    Frames unencrypted xRIT files into a VCDU stream
+
+    Arguments:
+        files {list} -- (name, payload, xRIT file) tuples
+
+    Returns:
+        list -- VCDUs
+    """
+
+    buf = io.BytesIO()
+    stream = Stream(buf)
+    for name, payload, x in files:
+        stream.file(0, 0, x)
+    data = buf.getvalue()
+    return [data[i : i + 892] for i in range(0, len(data), 892)]
+
+
+def compare(path):
+    """
+    Compares results against a baseline
+
+    Arguments:
+        path {string} -- Path of baseline results JSON
+
+    Returns:
+        bool -- Regression found
+    """
+
+    with open(path) as f:
+        baseline = json.load(f)
+
+    print("\nCOMPARED WITH \"{}\" ({})".format(path, baseline.get('commit') or baseline.get('time')))
+    print("{:<18}{:>14}{:>14}{:>10}".format("STAGE", "BASELINE/s", "CURRENT/s", "CHANGE"))
+
+    regressions = []
+    for name, r in results.items():
+        base = baseline['stages'].get(name)
+        if not base or not base['rate'] or base['items'] != r['items']:
+            print("{:<18}{:>14}{:>14.1f}{:>10}".format(name, "-", r['rate'], "-"))
+            continue
+
+        change = (r['rate'] / base['rate'] - 1) * 100
+        flag = "  REGRESSION" if change < -args.threshold else ""
+        if flag: regressions.append(name)
+        print("{:<18}{:>14.1f}{:>14.1f}{:>9.1f}%{}".format(name, base['rate'], r['rate'], change, flag))
+
+    if regressions:
+        print("\n{} STAGE{} SLOWER THAN BASELINE BY MORE THAN {}%".format(len(regressions), "S" if len(regressions) > 1 else "", args.threshold))
+    else:
+        print("\nNo regressions")
+
+    return len(regressions) > 0
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Discards pipeline console output
+    """
+
+    with open(os.devnull, "w") as null:
+        with contextlib.redirect_stdout(null):
+            yield
+
+
+def get_commit():
+    """
+    Returns current git commit hash (None outside a git checkout)
+    """
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss():
+    """
+    Returns peak resident set size of the process in bytes (None if unavailable)
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+try:
+    init()
+except KeyboardInterrupt:
+    print("Exiting...")
+    exit()
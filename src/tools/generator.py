@@ -0,0 +1,387 @@
+"""
+generator.py
+https://github.com/sam210723/xrit-rx
+
+Generates synthetic GK-2A LRIT/HRIT VCDU streams for load testing.
+"""
+
+import argparse
+import binascii
+from collections import namedtuple
+from datetime import datetime, timedelta
+import io
+import os
+import sys
+
+from Crypto.Cipher import DES
+import numpy as np
+from PIL import Image
+
+# Import pipeline from parent directory
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import products
+
+# Globals
+args = None             # Parsed CLI arguments
+scid = 195              # GK-2A spacecraft ID
+zone = 884              # M_PDU packet zone length
+chunk = 8190            # CP_PDU data length (excluding CRC)
+rates = { "LRIT": 64 * 1024, "HRIT": 3 * 1024 * 1024 }     # Downlink bit rates (bits/sec)
+
+# TP_File counter of first segment of each channel
+counters = { "VI006": 0, "SW038": 10, "WV069": 20, "IR105": 30, "IR123": 40 }
+
+# Application Process IDs of each virtual channel (not used by xrit-rx)
+apids = { 0: 6, 4: 8 }
+
+
+def init():
+    global args
+
+    args = parse_args()
+    rng = np.random.RandomState(args.seed)
+
+    # Encryption key
+    key = None
+    if args.keys:
+        key = load_key(args.keys, rng)
+        print("Encrypting files with key index 0x{} from \"{}\"".format(key[0].hex().upper(), args.keys))
+
+    # Channels to generate
+    res = products.get_resolutions(namedtuple('config', 'spacecraft downlink')("GK-2A", args.downlink), "FD")
+    chans = args.channels.upper().split(",") if args.channels else list(res)
+    for c in chans:
+        if c not in res:
+            print("Channel \"{}\" is not available on {}".format(c, args.downlink))
+            exit(1)
+
+    print("Generating {} segments for {}...".format(args.downlink, ", ".join(chans)))
+    segments = { c: make_segments(c, res[c][0], rng) for c in chans }
+
+    with open(args.output, "wb") as f:
+        stream = Stream(f, args.fill)
+        start = datetime.strptime(args.start, "%Y%m%d%H%M")
+
+        for n in range(args.products):
+            t = start + timedelta(minutes=10 * n)
+            files = full_disk(t, segments, key)
+            for vcid, counter, name, data in files:
+                stream.file(vcid, counter, data)
+            print("  FD {:%Y-%m-%d %H:%M} UTC: {} files".format(t, len(files)))
+
+    realtime = stream.vcdus * 892 * 8 / rates[args.downlink]
+    print("\nWrote {} VCDUs ({} fill, {:.2f} MB) to \"{}\"".format(stream.vcdus, stream.fills, stream.vcdus * 892 / 1e6, args.output))
+    print("Real-time {} duration: {:.1f} s".format(args.downlink, realtime))
+
+
+def parse_args():
+    """
+    Parses command line arguments
+    """
+
+    argp = argparse.ArgumentParser(description="Generates synthetic GK-2A LRIT/HRIT VCDU streams for load testing.")
+    argp.add_argument("-o", "--output", action="store", help="Output VCDU file (default \"synthetic.bin\")", default="synthetic.bin")
+    argp.add_argument("--downlink", action="store", help="LRIT or HRIT (default HRIT)", type=str.upper, choices=["LRIT", "HRIT"], default="HRIT")
+    argp.add_argument("--channels", action="store", help="Comma separated channels to include (default all channels of downlink)", default=None)
+    argp.add_argument("--products", action="store", help="Number of consecutive full disks (default 1)", type=int, default=1)
+    argp.add_argument("--start", action="store", help="Time of first full disk as YYYYMMDDhhmm (default 202001010000)", default="202001010000")
+    argp.add_argument("--fill", action="store", help="Fraction of VCDUs which are fill (VCID 63) between files (default 0)", type=float, default=0)
+    argp.add_argument("--interleave", action="store", help="Send channels one after another, or segment by segment across channels (default channel)", choices=["channel", "segment"], default="channel")
+    argp.add_argument("--keys", action="store", help="Encrypt files with the first key in this key file (created if missing)", default=None)
+    argp.add_argument("--seed", action="store", help="Seed for generated image data and keys (default 0)", type=int, default=0)
+    args = argp.parse_args()
+
+    if not 0 <= args.fill < 1: argp.error("--fill must be at least 0 and less than 1")
+    return args
+
+
+class Stream:
+    """
+    Writes TP_Files as CP_PDUs framed in M_PDUs and VCDUs
+    """
+
+    def __init__(self, f, fill=0):
+        """
+        Arguments:
+            f {file} -- Output file object
+            fill {float} -- Fraction of VCDUs which are fill
+        """
+
+        self.f = f
+        self.fill = fill
+        self.owed = 0           # Fill VCDUs owed to reach fill ratio
+        self.vcdus = 0          # VCDUs written
+        self.fills = 0          # Fill VCDUs written
+        self.vcdu = {}          # VCDU counters by VCID
+        self.cppdu = {}         # CP_PDU counters by APID
+
+    def file(self, vcid, counter, data):
+        """
+        Writes TP_File to a virtual channel
+
+        Arguments:
+            vcid {int} -- Virtual channel ID
+            counter {int} -- TP_File counter
+            data {bytes} -- S_PDU
+        """
+
+        apid = apids.get(vcid, vcid)
+        tp = counter.to_bytes(2, 'big') + (len(data) * 8).to_bytes(8, 'big') + data
+
+        # xrit-rx expects every TP_File to start with a FIRST CP_PDU and end with a LAST CP_PDU
+        size = min(chunk, (len(tp) + 1) // 2)
+        parts = [tp[i : i + size] for i in range(0, len(tp), size)]
+
+        # CP_PDUs are packed back to back, remainder of last M_PDU is zero padding (read as EOF marker)
+        zonedata = b''
+        headers = []
+        for i, part in enumerate(parts):
+            seq = 1 if i == 0 else 2 if i == len(parts) - 1 else 0
+            headers.append(len(zonedata))
+            zonedata += cppdu(apid, seq, self.next_counter(apid), part)
+
+        pad = -len(zonedata) % zone
+        if pad: headers.append(len(zonedata))
+        zonedata += b'\x00' * pad
+
+        # Frame packet zone into M_PDUs with pointer to first CP_PDU header in each
+        packets = len(zonedata) // zone
+        first = 0
+        for p in range(packets):
+            while first < len(headers) and headers[first] < p * zone: first += 1
+            if first < len(headers) and headers[first] < (p + 1) * zone:
+                pointer = headers[first] - p * zone
+            else:
+                pointer = 2047
+
+            self.write(vcid, pointer.to_bytes(2, 'big') + zonedata[p * zone : (p + 1) * zone])
+
+        # Fill between files
+        self.owed += packets * self.fill / (1 - self.fill)
+        while self.owed >= 1:
+            self.write(63, b'\x07\xFF' + b'\x00' * zone)
+            self.fills += 1
+            self.owed -= 1
+
+    def write(self, vcid, mpdu):
+        """
+        Writes VCDU containing an M_PDU
+        """
+
+        count = self.vcdu.get(vcid, 0)
+        self.vcdu[vcid] = (count + 1) % 16777216
+
+        header = ((1 << 14) | (scid << 6) | vcid).to_bytes(2, 'big') + count.to_bytes(3, 'big') + b'\x00'
+        self.f.write(header + mpdu)
+        self.vcdus += 1
+
+    def next_counter(self, apid):
+        """
+        Returns next CP_PDU sequence counter of an APID
+        """
+
+        count = self.cppdu.get(apid, 0)
+        self.cppdu[apid] = (count + 1) % 16384
+        return count
+
+
+def cppdu(apid, seq, counter, data):
+    """
+    Builds CP_PDU with CRC-16/CCITT-FALSE
+
+    Arguments:
+        apid {int} -- Application Process ID
+        seq {int} -- Sequence flag (0 continue, 1 first, 2 last, 3 single)
+        counter {int} -- Packet sequence counter
+        data {bytes} -- Packet data
+
+    Returns:
+        bytes -- CP_PDU
+    """
+
+    header = apid.to_bytes(2, 'big') + ((seq << 14) | counter).to_bytes(2, 'big') + (len(data) + 1).to_bytes(2, 'big')
+    crc = binascii.crc_hqx(data, 0xFFFF)
+    return header + data + crc.to_bytes(2, 'big')
+
+
+def full_disk(t, segments, key=None):
+    """
+    Returns xRIT files of one full disk in transmission order
+
+    Arguments:
+        t {datetime} -- Start of full disk
+        segments {dict} -- Encoded segments by channel
+        key {tuple} -- Key index and DES key (None for no encryption)
+
+    Returns:
+        list -- (VCID, TP_File counter, file name, S_PDU) tuples
+    """
+
+    seq = (t.hour * 60 + t.minute) // 10
+    stamp = "{:%Y%m%d}_{:%H%M}06".format(t, t)
+    ext = args.downlink.lower()
+
+    images = {}
+    for c, segs in segments.items():
+        images[c] = []
+        for num, data in enumerate(segs, 1):
+            name = "IMG_FD_{:03d}_{}_{}_{:02d}.{}".format(seq, c, stamp, num, ext)
+            images[c].append((0, counters[c] + num - 1, name, build_xrit(name, data, 0, key)))
+
+    if args.interleave == "segment":
+        files = [f for group in zip(*images.values()) for f in group]
+    else:
+        files = [f for c in images for f in images[c]]
+
+    # Daily Operation Plan on alphanumeric text channel, sent part way through the image
+    name = "ADD_ANT_{:03d}_{}_00.{}".format(seq, stamp, ext)
+    files.insert(len(files) // 2, (4, 0, name, build_xrit(name, dop(t), 2, key)))
+
+    return files
+
+
+def make_segments(chan, size, rng):
+    """
+    Encodes 10 image segments of a channel (JPEG for LRIT, lossless 10-bit J2K for HRIT)
+
+    Arguments:
+        chan {string} -- Channel name
+        size {int} -- Channel width and height
+        rng {numpy.random.RandomState} -- Random number generator
+
+    Returns:
+        list -- Encoded segments
+    """
+
+    segs = []
+    rows = size // 10
+
+    for num in range(10):
+        buf = io.BytesIO()
+        if args.downlink == "LRIT":
+            img = earth(size, 8, rng, (num * rows, (num + 1) * rows))
+            Image.fromarray(img).save(buf, format="JPEG", quality=85)
+        else:
+            img = earth(size, 10, rng, (num * rows, (num + 1) * rows))
+            Image.fromarray(img).save(buf, format="JPEG2000", irreversible=False)
+        segs.append(buf.getvalue())
+
+    print("  {}: {:.2f} MB".format(chan, sum(len(s) for s in segs) / 1e6))
+    return segs
+
+
+def earth(size, depth, rng, rows=None):
+    """
+    Generates a textured disk resembling a full disk image
+
+    Arguments:
+        size {int} -- Image width and height
+        depth {int} -- Bits per pixel (8 or 10)
+        rng {numpy.random.RandomState} -- Random number generator
+        rows {tuple} -- First and last row to generate (default all)
+
+    Returns:
+        numpy.ndarray -- Image array (uint8 or uint16)
+    """
+
+    top, bottom = rows or (0, size)
+    y, x = np.mgrid[top:bottom, 0:size].astype(np.float32) / size - 0.5
+    r = np.sqrt(x * x + y * y)
+
+    # Cloud-like texture from a few sine waves, noise and a disk mask
+    img = 0.5 + 0.15 * np.sin(x * 37) * np.cos(y * 23) + 0.1 * np.sin((x + y) * 91)
+    img += rng.normal(0, 0.01, img.shape)
+    img *= (r < 0.48)
+
+    peak = (1 << depth) - 1
+    return (np.clip(img, 0, 1) * peak).astype(np.uint8 if depth == 8 else np.uint16)
+
+
+def dop(t):
+    """
+    Generates Daily Operation Plan listing every full disk of the day
+
+    Arguments:
+        t {datetime} -- Date of plan
+
+    Returns:
+        bytes -- DOP text
+    """
+
+    lines = [
+        "GK-2A AMI {} DOP(Daily Operation Plan)".format(args.downlink),
+        "DATE: {:%Y-%m-%d}".format(t),
+        "",
+        "TIME(UTC)\tCONTENT\tCHANNEL\tOUTPUT"
+    ]
+
+    for seq in range(144):
+        s = seq * 10
+        lines.append("{:02d}{:02d}00-{:02d}{:02d}59\tFD{:03d}\tIR105\tO".format(s // 60, s % 60, s // 60, s % 60 + 9, seq))
+
+    lines += ["", "ABBREVIATIONS:", "FD: Full Disk", ""]
+    return "\r\n".join(lines).encode('utf-8')
+
+
+def build_xrit(name, data, ftype=0, key=None):
+    """
+    Builds xRIT file, encrypting the data field if a key is given
+
+    Arguments:
+        name {string} -- File name (annotation text)
+        data {bytes} -- Data field
+        ftype {int} -- xRIT file type
+        key {tuple} -- Key index and DES key (None for no encryption)
+
+    Returns:
+        bytes -- xRIT file (S_PDU)
+    """
+
+    index = b'\x00\x00'
+    if key != None:
+        # Pad data field to whole DES blocks
+        index = key[0]
+        data += b'\x00' * (-len(data) % 8)
+        data = DES.new(key[1], DES.MODE_ECB).encrypt(data)
+
+    annotation = b'\x04' + (3 + len(name)).to_bytes(2, 'big') + name.encode('utf-8')
+    keyh = b'\x07' + (7).to_bytes(2, 'big') + b'\x00\x00' + index
+    hlen = 16 + len(annotation) + len(keyh)
+
+    primary = b'\x00' + (16).to_bytes(2, 'big') + bytes([ftype]) + hlen.to_bytes(4, 'big') + (len(data) * 8).to_bytes(8, 'big')
+    return primary + annotation + keyh + data
+
+
+def load_key(path, rng):
+    """
+    Loads first key from a key file, creating a test key file if it does not exist
+
+    Arguments:
+        path {string} -- Key file path
+        rng {numpy.random.RandomState} -- Random number generator
+
+    Returns:
+        tuple -- Key index and DES key
+    """
+
+    if not os.path.exists(path):
+        # Key file format: key count, then key index and key of each key
+        index = b'\x00\x01'
+        key = bytes(rng.randint(0, 256, 8).astype(np.uint8))
+        with open(path, "wb") as f:
+            f.write((1).to_bytes(2, 'big') + index + key)
+        print("Created test key file \"{}\"".format(path))
+
+    with open(path, "rb") as f:
+        data = f.read(12)
+
+    return data[2:4], data[4:12]
+
+
+if __name__ == "__main__":
+    try:
+        init()
+    except KeyboardInterrupt:
+        print("Exiting...")
+        exit()
@@ -0,0 +1,200 @@
+"""
+loopback.py
+https://github.com/sam210723/xrit-rx
+
+Stand-in goesrecv, Open Satellite Project and UDP sources which serve a VCDU file to xrit-rx.
+"""
+
+import argparse
+import random
+import socket
+from time import perf_counter, sleep
+
+# Globals
+args = None             # Parsed CLI arguments
+rates = { "LRIT": 64 * 1024, "HRIT": 3 * 1024 * 1024 }     # Downlink bit rates (bits/sec)
+ports = { "goesrecv": 5004, "osp": 5001, "udp": 5002 }      # Default ports from xrit-rx.ini
+sp_sub = b'\x00\x53\x50\x00\x00\x21\x00\x00'                # nanomsg SP header (SUB socket)
+sp_pub = b'\x00\x53\x50\x00\x00\x20\x00\x00'                # nanomsg SP header (PUB socket)
+fill = b'\x70\xFF' + (b'\x00' * 890)                           # Fill VCDU (VCID 63)
+
+
+def init():
+    global args
+
+    args = parse_args()
+    random.seed(args.seed)
+
+    with open(args.FILE, "rb") as f:
+        data = f.read()
+    packets = [data[i : i + 892] for i in range(0, len(data) - 891, 892)]
+
+    port = args.port or ports[args.mode]
+    if args.speed:
+        print("Serving {} VCDUs at {}x real-time {} ({:.1f} VCDU/s)".format(len(packets), args.speed, args.downlink, vcdu_rate()))
+    else:
+        print("Serving {} VCDUs as fast as possible".format(len(packets)))
+
+    if args.mode == "udp":
+        sck = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        print("Sending UDP datagrams to {}:{}".format(args.ip, port))
+        serve(packets, lambda p: sck.sendto(p, (args.ip, port)))
+        return
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((args.ip, port))
+    server.listen(1)
+
+    # Serve each client in turn
+    while True:
+        print("Waiting for {} client on {}:{}...".format("goesrecv" if args.mode == "goesrecv" else "OSP", args.ip, port))
+        client, addr = server.accept()
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print("Client connected ({}:{})".format(*addr))
+
+        try:
+            if args.mode == "goesrecv":
+                # nanomsg SP handshake, then each VCDU is sent as a message with 64-bit length prefix
+                header = recv(client, 8)
+                if header != sp_sub:
+                    print("Bad nanomsg header from client: {}".format(header.hex().upper()))
+                    client.close()
+                    continue
+                client.sendall(sp_pub)
+                finished = serve(packets, lambda p: client.sendall(len(p).to_bytes(8, 'big') + p))
+            else:
+                finished = serve(packets, client.sendall)
+
+            # Hold link open until client disconnects
+            if finished:
+                print("Finished serving file, waiting for client to disconnect")
+                recv(client, 1)
+                print("Client disconnected")
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected")
+            finished = False
+        finally:
+            client.close()
+
+        if finished and not args.wait: break
+
+
+def parse_args():
+    """
+    Parses command line arguments
+    """
+
+    argp = argparse.ArgumentParser(description="Stand-in goesrecv, Open Satellite Project and UDP sources which serve a VCDU file to xrit-rx.")
+    argp.add_argument("FILE", action="store", help="VCDU file to serve (recording, --dump output or tools/generator.py stream)")
+    argp.add_argument("--mode", action="store", help="Protocol to serve (goesrecv, osp or udp)", type=str.lower, choices=list(ports), required=True)
+    argp.add_argument("--ip", action="store", help="Address to listen on, or send UDP datagrams to (default 127.0.0.1)", default="127.0.0.1")
+    argp.add_argument("--port", action="store", help="Port to listen on, or send UDP datagrams to (default from xrit-rx.ini)", type=int, default=None)
+    argp.add_argument("--downlink", action="store", help="Downlink rate used by --speed (LRIT or HRIT, default HRIT)", type=str.upper, choices=list(rates), default="HRIT")
+    argp.add_argument("--speed", action="store", help="Multiple of real-time downlink rate (default 1, 0 for as fast as possible)", type=float, default=1)
+    argp.add_argument("--jitter", action="store", help="Maximum random delay added to each VCDU in ms (default 0)", type=float, default=0)
+    argp.add_argument("--disconnect", action="store", help="Drop link after every N VCDUs (default 0 for never)", type=int, default=0)
+    argp.add_argument("--outage", action="store", help="Seconds of VCDUs lost each time UDP link drops (default 1)", type=float, default=1)
+    argp.add_argument("--loop", action="store", help="Number of times to serve file (default 1, 0 for forever)", type=int, default=1)
+    argp.add_argument("--wait", action="store_true", help="Wait for another client after file has been served")
+    argp.add_argument("--seed", action="store", help="Seed for jitter (default 0)", type=int, default=0)
+    return argp.parse_args()
+
+
+def serve(packets, send):
+    """
+    Sends VCDUs at the configured rate
+
+    Arguments:
+        packets {list} -- VCDUs to send
+        send {function} -- Sends one VCDU
+
+    Returns:
+        bool -- All VCDUs were sent (False if TCP link was dropped)
+    """
+
+    interval = 1 / vcdu_rate() if args.speed else 0
+    start = perf_counter()
+    due = start
+    sent = 0            # VCDUs sent
+    linked = 0          # VCDUs sent since link was last dropped
+    lost = 0            # VCDUs left to drop during UDP outage
+    count = 0
+
+    while args.loop == 0 or count < args.loop:
+        for p in packets:
+            # VCDUs due during UDP outage are lost
+            if lost:
+                lost -= 1
+                continue
+
+            # Drop link
+            if args.disconnect and linked == args.disconnect:
+                if args.mode != "udp":
+                    print("Dropping link after {} VCDUs".format(sent))
+                    report(sent, start)
+                    return False
+
+                # UDP has no connection, drop VCDUs for length of outage instead
+                lost = int(args.outage * (vcdu_rate() if args.speed else rates[args.downlink] / (892 * 8)))
+                print("Dropping {} VCDUs ({:.1f} s) after {} VCDUs".format(lost, args.outage, sent))
+                due += args.outage
+                linked = 0
+                lost -= 1
+                continue
+
+            # Pace VCDUs to the target rate, sleeping only when ahead of schedule
+            due += interval
+            wait = due + random.uniform(0, args.jitter) / 1000 - perf_counter()
+            if wait > 0.001: sleep(wait)
+
+            send(p)
+            sent += 1
+            linked += 1
+
+        count += 1
+
+    # Single fill VCDU triggers TP_File processing inside channel handlers
+    send(fill)
+
+    report(sent, start)
+    return True
+
+
+def vcdu_rate():
+    """
+    Returns target VCDUs per second
+    """
+
+    return rates[args.downlink] / (892 * 8) * args.speed
+
+
+def report(sent, start):
+    """
+    Prints VCDUs sent and achieved rate
+    """
+
+    elapsed = perf_counter() - start
+    rate = sent / elapsed if elapsed else 0
+    print("Sent {} VCDUs in {:.2f} s ({:.1f} VCDU/s, {:.2f} Mbps)".format(sent, elapsed, rate, rate * 892 * 8 / 1e6))
+
+
+def recv(sck, n):
+    """
+    Receives exactly n bytes from a TCP socket (fewer if connection is closed)
+    """
+
+    data = b''
+    while len(data) < n:
+        chunk = sck.recv(n - len(data))
+        if not chunk: break
+        data += chunk
+    return data
+
+
+if __name__ == "__main__":
+    try:
+        init()
+    except KeyboardInterrupt:
+        print("Exiting...")
+        exit()
@@ -0,0 +1,137 @@
+"""
+tracer.py
+https://github.com/sam210723/xrit-rx
+
+Records pipeline events for export as Chrome Trace Event JSON (chrome://tracing, Perfetto)
+"""
+
+from collections import deque
+from functools import wraps
+import json
+import os
+import threading
+from time import perf_counter
+
+import ccsds as CCSDS
+import products
+
+enabled = False         # Tracing enabled flag
+events = deque()        # Recorded events (name, category, begin, end, thread ID, args)
+threads = {}            # Thread names by thread ID
+origin = perf_counter() # Trace start time
+
+# Pipeline steps to trace (event name, category, class, method)
+# Wrappers are only installed when tracing is enabled
+# Saves started by a product add (e.g. a channel's last segment) appear as nested spans
+spans = [
+    ("CP_PDU finish",       "ccsds",    CCSDS.CP_PDU,                   "finish"),
+    ("TP_File finish",      "ccsds",    CCSDS.TP_File,                  "finish"),
+    ("S_PDU decrypt",       "ccsds",    CCSDS.S_PDU,                    "__init__"),
+    ("xRIT save",           "io",       CCSDS.xRIT,                     "save"),
+    ("Product add",         "product",  products.MultiSegmentImage,     "add"),
+    ("Product add",         "product",  products.SingleSegmentImage,    "add"),
+    ("Product add",         "product",  products.AlphanumericText,      "add"),
+    ("J2K decode",          "decode",   products.MultiSegmentImage,     "convert_to_array"),
+    ("Channel encode",      "encode",   products.MultiSegmentImage,     "save_channel"),
+    ("Tile pyramid",        "encode",   products.MultiSegmentImage,     "save_tiles"),
+    ("Tile encode",         "encode",   products.MultiSegmentImage,     "save_tile"),
+    ("Radiometric save",    "io",       products.MultiSegmentImage,     "save_raw"),
+    ("Preview encode",      "encode",   products.Previews,              "encode"),
+    ("Image save",          "encode",   products.SingleSegmentImage,    "save"),
+    ("Text save",           "io",       products.AlphanumericText,      "save")
+]
+
+
+def enable(size=100000):
+    """
+    Enables tracing and installs wrappers around traced pipeline steps
+
+    Arguments:
+        size {int} -- Maximum number of events kept (oldest are discarded)
+    """
+
+    global enabled
+    global events
+    global origin
+
+    if enabled: return
+
+    events = deque(maxlen=size)
+    origin = perf_counter()
+    enabled = True
+
+    for name, cat, cls, method in spans:
+        setattr(cls, method, traced(name, cat, getattr(cls, method)))
+
+
+def traced(name, cat, func):
+    """
+    Returns function wrapped to record a complete event for each call
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        begin = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            complete(name, cat, begin)
+
+    return wrapper
+
+
+def complete(name, cat, begin, end=None, args=None):
+    """
+    Records a complete (begin and end) event on the calling thread
+
+    Arguments:
+        name {string} -- Event name
+        cat {string} -- Event category
+        begin {float} -- Start time (perf_counter)
+        end {float} -- End time (perf_counter, default now)
+        args {dict} -- Event arguments shown in trace viewer
+    """
+
+    if end == None: end = perf_counter()
+
+    tid = threading.get_ident()
+    if tid not in threads: threads[tid] = threading.current_thread().name
+
+    events.append((name, cat, begin, end, tid, args))
+
+
+def export():
+    """
+    Returns recorded events as Chrome Trace Event JSON
+    """
+
+    pid = os.getpid()
+    trace = []
+
+    # Thread name metadata
+    for tid, name in list(threads.items()):
+        trace.append({ 'name': "thread_name", 'ph': "M", 'pid': pid, 'tid': tid, 'args': { 'name': name } })
+
+    for name, cat, begin, end, tid, args in list(events):
+        e = {
+            'name': name,
+            'cat': cat,
+            'ph': "X",
+            'ts': round((begin - origin) * 1e6, 1),
+            'dur': round((end - begin) * 1e6, 1),
+            'pid': pid,
+            'tid': tid
+        }
+        if args != None: e['args'] = args
+        trace.append(e)
+
+    return json.dumps({ 'traceEvents': trace, 'displayTimeUnit': "ms" })
+
+
+def save(path):
+    """
+    Writes recorded events to a Chrome Trace Event JSON file
+    """
+
+    with open(path, "w") as f:
+        f.write(export())
@@ -11,13 +11,19 @@ from collections import namedtuple
 import colorama
 from colorama import Fore, Back, Style
 from configparser import ConfigParser, NoOptionError, NoSectionError
-from os import mkdir, path
+from contextlib import redirect_stdout
+from os import devnull, mkdir, path
+import signal
 import socket
-from time import time, sleep
+from threading import current_thread
+from time import perf_counter, time, sleep
 
 from demuxer import Demuxer
 import ccsds as CCSDS
 from dash import Dashboard
+import sink
+import timers
+import tracer
 
 
 # Globals
@@ -30,8 +36,15 @@ downlink = None         # Downlink type (LRIT/HRIT)
 output = None           # Output path root
 output_images = None    # Flag for saving Images to disk
 output_xrit = None      # Flag for saving xRIT files to disk
+output_radiometric = None   # Full depth image output format (none/png/tiff/npy)
+output_timeout = None   # Incomplete product timeout (sec)
+output_memory = None    # Open product memory budget (MB)
+output_prewarm = None   # Seconds before scheduled transmissions to pre-warm resources
+output_preview = None   # Segments between progressive previews (0 to disable)
+output_tiles = None     # Flag for saving deep zoom tile pyramids
 blacklist = []          # VCID blacklist
 packetf = None          # Packet file object
+soak = []               # Traced memory after each soak test pass
 keypath = None          # Decryption key file path
 keys = {}               # Decryption keys
 sck = None              # TCP/UDP socket object
@@ -41,6 +54,14 @@ dash = None             # Dashboard class object
 dashe = None            # Dashboard enabled flag
 dashp = None            # Dashboard HTTP port
 dashi = None            # Dashboard refresh interval (sec)
+dashc = None            # Dashboard concurrent connection limit
+dasht = None            # Dashboard request timeout (sec)
+dashb = None            # Dashboard per-client file bandwidth limit (KB/s)
+dashm = None            # Dashboard thumbnail memory cache size (MB)
+dashd = None            # Dashboard thumbnail disk cache path
+dashk = None            # Dashboard thumbnail disk cache size (MB)
+dasha = None            # Dashboard admin endpoint token
+rates = { "LRIT": 64 * 1024, "HRIT": 3 * 1024 * 1024 }     # Downlink bit rates (bits/sec)
 ver = "1.3.1"           # xrit-rx version
 
 
@@ -74,8 +95,34 @@ def init():
     # Load decryption keys
     load_keys()
 
+    # Soak test replays packet file with memory diagnostics enabled
+    if args.soak:
+        if args.file == None:
+            print(Fore.WHITE + Back.RED + Style.BRIGHT + "SOAK TEST REQUIRES A PACKET FILE (--file)")
+            safe_stop()
+        if not args.memdiag: args.memdiag = 60
+
+    # Benchmark replays packet file as fast as possible with output files discarded
+    if args.bench:
+        if args.file == None:
+            print(Fore.WHITE + Back.RED + Style.BRIGHT + "BENCHMARK REQUIRES A PACKET FILE (--file)")
+            safe_stop()
+        sink.null = True
+        args.profile = True
+
+    # Start recording trace events
+    if args.trace != None: tracer.enable()
+
+    # Install pipeline stage timers
+    if args.profile:
+        timers.install()
+
+        # Print timing breakdown on SIGUSR1 (where supported)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: timers.report())
+
     # Create demuxer instance
-    demux_config = namedtuple('demux_config', 'spacecraft downlink verbose dump output images xrit blacklist keys')
+    demux_config = namedtuple('demux_config', 'spacecraft downlink verbose dump output images xrit blacklist keys radiometric timeout memory preview tiles prewarm memdiag')
     output += "/" + downlink + "/"
     demux = Demuxer(
         demux_config(
@@ -87,13 +134,20 @@ def init():
             output_images,
             output_xrit,
             blacklist,
-            keys
+            keys,
+            output_radiometric,
+            output_timeout,
+            output_memory,
+            output_preview,
+            output_tiles,
+            output_prewarm,
+            args.memdiag
         )
     )
 
     # Start dashboard server
     if dashe:
-        dash_config = namedtuple('dash_config', 'port interval spacecraft downlink output images xrit blacklist version')
+        dash_config = namedtuple('dash_config', 'port interval spacecraft downlink output images xrit blacklist version preview connections timeout bandwidth cache cache_path cache_disk tiles admin')
         dash = Dashboard(
             dash_config(
                 dashp,
@@ -104,7 +158,16 @@ def init():
                 output_images,
                 output_xrit,
                 blacklist,
-                ver
+                ver,
+                output_preview,
+                dashc,
+                dasht,
+                dashb,
+                dashm,
+                dashd,
+                dashk,
+                output_tiles,
+                dasha
             ),
             demux
         )
@@ -119,6 +182,9 @@ def init():
     # Get processing start time
     stime = time()
 
+    # Run benchmark instead of main loop
+    if args.bench: bench()
+
     # Enter main loop
     loop()
 
@@ -134,19 +200,29 @@ def loop():
 
     while True:
         if source == "GOESRECV":
+            # nanomsg message: 64-bit length followed by VCDU
             try:
-                data = sck.recv(buflen + 8)
+                header = recv(8)
+                length = int.from_bytes(header, 'big') if len(header) == 8 else 0
+
+                # Any other length means the stream is out of sync with message boundaries
+                data = recv(buflen) if length == buflen else b''
             except ConnectionResetError:
+                data = b''
+
+            if len(data) != buflen:
                 print(Fore.WHITE + Back.RED + Style.BRIGHT + "LOST CONNECTION TO GOESRECV")
                 safe_stop()
 
-            if len(data) == buflen + 8:
-                demux.push(data[8:])
+            demux.push(data)
         
         elif source == "OSP":
             try:
-                data = sck.recv(buflen)
+                data = recv(buflen)
             except ConnectionResetError:
+                data = b''
+
+            if len(data) != buflen:
                 print(Fore.WHITE + Back.RED + Style.BRIGHT + "LOST CONNECTION TO OPEN SATELLITE PROJECT")
                 safe_stop()
             
@@ -187,6 +263,9 @@ def loop():
                 if demux.complete():
                     runTime = round(time() - stime, 3)
                     print("\nFINISHED PROCESSING FILE ({}s)".format(runTime))
+
+                    # Replay file until soak test is complete
+                    if args.soak and soak_pass(): continue
                     safe_stop()
                 else:
                     # Limit loop speed when waiting for demuxer to finish processing
@@ -271,6 +350,26 @@ def connect_socket(addr):
         safe_stop()
 
 
+def recv(n):
+    """
+    Receives exactly n bytes from TCP input socket
+
+    Arguments:
+        n {int} -- Number of bytes to receive
+
+    Returns:
+        bytes -- Received data (shorter than n if connection was closed)
+    """
+
+    data = b''
+    while len(data) < n:
+        chunk = sck.recv(n - len(data))
+        if not chunk: break
+        data += chunk
+    
+    return data
+
+
 def nanomsg_init():
     """
     Sets up nanomsg publisher in goesrecv to send VCDUs over TCP
@@ -373,8 +472,18 @@ def parse_args():
     argp.add_argument("--file", action="store", help="Path to VCDU packet file", default=None)
     argp.add_argument("-v", action="store_true", help="Enable verbose console output (only useful for debugging)", default=False)
     argp.add_argument("--dump", action="store", help="Dump VCDUs (except fill) to file (only useful for debugging)", default=None)
+    argp.add_argument("--profile", action="store_true", help="Print time spent in each pipeline stage on exit or SIGUSR1", default=False)
+    argp.add_argument("--memdiag", action="store", nargs="?", type=int, const=60, help="Take memory snapshots every N seconds (default 60) for /api/stats/memory", default=0)
+    argp.add_argument("--bench", action="store_true", help="Replay packet file as fast as possible with output discarded, then print throughput (requires --file)", default=False)
+    argp.add_argument("--soak", action="store", type=int, help="Replay packet file N times (at least 4) and fail if memory keeps growing (requires --file)", default=0)
+    argp.add_argument("--trace", action="store", nargs="?", const="", help="Record pipeline events (written to Chrome Trace JSON file on exit if a path is given)", default=None)
+    parsed = argp.parse_args()
+
+    # First pass warms caches, so growth can only be confirmed over two more consecutive passes
+    if parsed.soak != 0 and parsed.soak < 4:
+        argp.error("--soak requires at least 4 passes")
 
-    return argp.parse_args()
+    return parsed
 
 
 def parse_config(path):
@@ -388,11 +497,24 @@ def parse_config(path):
     global output
     global output_images
     global output_xrit
+    global output_radiometric
+    global output_timeout
+    global output_memory
+    global output_prewarm
+    global output_preview
+    global output_tiles
     global blacklist
     global keypath
     global dashe
     global dashp
     global dashi
+    global dashc
+    global dasht
+    global dashb
+    global dashm
+    global dashd
+    global dashk
+    global dasha
 
     cfgp = ConfigParser()
     cfgp.read(path)
@@ -408,18 +530,42 @@ def parse_config(path):
         output = cfgp.get('output', 'path')
         output_images = cfgp.getboolean('output', 'images')
         output_xrit = cfgp.getboolean('output', 'xrit')
+        output_radiometric = cfgp.get('output', 'radiometric', fallback="none").lower()
+        output_timeout = cfgp.getint('output', 'timeout', fallback=300)
+        output_memory = cfgp.getint('output', 'memory', fallback=1024)
+        output_prewarm = cfgp.getint('output', 'prewarm', fallback=60)
+        output_preview = cfgp.getint('output', 'preview', fallback=0)
+        output_tiles = cfgp.getboolean('output', 'tiles', fallback=False)
         bl = cfgp.get('output', 'channel_blacklist')
         keypath = cfgp.get('rx', 'keys')
         dashe = cfgp.getboolean('dashboard', 'enabled')
         dashp = cfgp.get('dashboard', 'port')
         dashi = round((float(cfgp.get('dashboard', 'interval'))), 1)
+        dashc = cfgp.getint('dashboard', 'connections', fallback=16)
+        dasht = cfgp.getint('dashboard', 'timeout', fallback=30)
+        dashb = cfgp.getint('dashboard', 'bandwidth', fallback=0)
+        dashm = cfgp.getint('dashboard', 'cache', fallback=64)
+        dashd = cfgp.get('dashboard', 'cache_path', fallback="")
+        dashk = cfgp.getint('dashboard', 'cache_disk', fallback=256)
+        dasha = cfgp.get('dashboard', 'admin_token', fallback="")
     except (NoSectionError, NoOptionError) as e:
         print(Fore.WHITE + Back.RED + Style.BRIGHT + "ERROR PARSING CONFIG FILE: " + str(e).upper())
         safe_stop()
 
+    # Dashboard is not started while benchmarking
+    if args.bench: dashe = False
+
+    # Check radiometric output format
+    if output_radiometric not in ["none", "png", "tiff", "npy"]:
+        print(Fore.WHITE + Back.RED + Style.BRIGHT + "UNKNOWN RADIOMETRIC OUTPUT FORMAT: \"{}\"".format(output_radiometric))
+        safe_stop()
+
     # Limit dashboard refresh interval
     if dashi < 1: dashi = 1
 
+    # Allow at least one dashboard connection
+    if dashc < 1: dashc = 1
+
     # If VCID blacklist is not empty
     if bl != "":
         # Parse blacklist string into int or list
@@ -469,6 +615,9 @@ def print_config():
         
         print("IGNORED VCIDs:    {}".format(blacklist_str))
     
+    if output_radiometric != "none":
+        print("RADIOMETRIC:      {} (HRIT only)".format(output_radiometric.upper()))
+
     print("KEY FILE:         {}".format(keypath))
     
     if dashe:
@@ -481,8 +630,93 @@ def print_config():
     if args.dump:
         print(Fore.GREEN + Style.BRIGHT + "WRITING PACKETS TO: \"{}\"".format(args.dump))
 
+    if args.bench:
+        print(Fore.GREEN + Style.BRIGHT + "BENCHMARK MODE: OUTPUT FILES ARE DISCARDED")
+
 
-def safe_stop(message=True):
+def bench():
+    """
+    Replays packet file through the demuxer as fast as possible then prints throughput
+    """
+
+    global packetf
+
+    # Load whole file so disk reads are not timed
+    data = packetf.read()
+    packetf.close()
+    packets = [data[i : i + buflen] for i in range(0, len(data) - buflen + 1, buflen)]
+
+    # Console output is suppressed so terminal speed is not timed
+    print("RUNNING BENCHMARK ({} VCDUs)...".format(len(packets)))
+    with open(devnull, "w") as null, redirect_stdout(null):
+        start = perf_counter()
+        for p in packets: demux.push(p)
+
+        # Append single fill VCDU (VCID 63)
+        # Triggers TP_File processing inside channel handlers
+        demux.push(b'\x70\xFF\x00\x00\x00\x00')
+
+        # Wait for queue to empty then stop demuxer, which saves open products
+        while not demux.complete(): sleep(0.01)
+        demux.stop()
+        demux.coreThread.join()
+
+        elapsed = perf_counter() - start
+    rate = len(packets) / elapsed
+
+    print("\n" + Fore.GREEN + Style.BRIGHT + "BENCHMARK")
+    print("VCDUs:            {}".format(len(packets)))
+    print("TIME:             {:.3f} s".format(elapsed))
+    print("THROUGHPUT:       {:.1f} VCDU/s ({:.2f} Mbps)".format(rate, rate * buflen * 8 / 1e6))
+
+    # Compare against VCDU rate of each downlink
+    for dl, bps in rates.items():
+        realtime = bps / (buflen * 8)
+        print("REAL-TIME {}:   {:.1f}x ({:.1f} VCDU/s)".format(dl, rate / realtime, realtime))
+
+    print("DISCARDED OUTPUT: {} files ({:.2f} MB)".format(sink.files, sink.written / 1048576))
+
+    if rate < rates[downlink] / (buflen * 8):
+        print(Fore.WHITE + Back.RED + Style.BRIGHT + "SLOWER THAN REAL-TIME {}".format(downlink))
+
+    safe_stop(message=False)
+
+
+def soak_pass():
+    """
+    Records memory after a soak test pass and reopens packet file for the next pass
+
+    Returns:
+        bool -- Another pass is required
+    """
+
+    global packetf
+    global stime
+
+    # Allow demuxer to finish last VCDU
+    sleep(1)
+    soak.append(demux.memory.measure())
+    print(Fore.GREEN + Style.BRIGHT + "SOAK TEST PASS {}/{}: {:.2f} MB TRACED".format(len(soak), args.soak, soak[-1] / 1048576))
+
+    if len(soak) < args.soak:
+        packetf = open(args.file, 'rb')
+        stime = time()
+        return True
+
+    # First pass warms caches, memory should stop growing after it
+    growth = soak[-1] - soak[min(1, len(soak) - 1)]
+    steps = [b - a for a, b in zip(soak[1:], soak[2:])]
+    if len(steps) >= 2 and all(s > 0 for s in steps) and growth > 1048576:
+        print(Fore.WHITE + Back.RED + Style.BRIGHT + "SOAK TEST FAILED: MEMORY GREW {:.2f} MB OVER {} PASSES".format(growth / 1048576, len(steps)))
+        for site in demux.memory.state()['growth'][:5]:
+            print("    {:>10.1f} KB  {}".format(site['growth'] / 1024, site['site']))
+        safe_stop(code=1)
+
+    print(Fore.GREEN + Style.BRIGHT + "SOAK TEST PASSED ({:+.2f} MB AFTER FIRST PASS)".format(growth / 1048576))
+    return False
+
+
+def safe_stop(message=True, code=0):
     """
     Safely kill threads and exit
     """
@@ -490,8 +724,17 @@ def safe_stop(message=True):
     if demux != None: demux.stop()
     if dash != None: dash.stop()
 
+    # Wait for demuxer to save open products so they are included in profile and trace
+    if demux != None and demux.coreThread != None and demux.coreThread != current_thread():
+        demux.coreThread.join(30)
+
+    if args != None and args.profile: timers.report()
+    if args != None and args.trace:
+        tracer.save(args.trace)
+        print(Fore.GREEN + Style.BRIGHT + "SAVED TRACE \"{}\"".format(args.trace))
+
     if message: print("\nExiting...")
-    exit()
+    exit(code)
 
 
 try: